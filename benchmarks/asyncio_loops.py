@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Park Ilsu. See LICENSE for details.
+
+"""Benchmark `HTTPServer` on native `PollReactor` against `AsyncioReactor`.
+
+Server runs in forked process and client sends requests from a few
+threads, opening new connection for each request. `uvloop` is measured
+too if it is installed.
+
+    $ PYTHONPATH=. python benchmarks/asyncio_loops.py
+
+"""
+
+import os
+import sys
+import time
+import signal
+import socket
+import platform
+import threading
+
+from wind.web.app import WindApp, path
+
+PORT = 9100
+REQUESTS = 5000
+CONCURRENCY = 8
+# Server keeps HTTP/1.1 connections alive, so ask it to close the
+# connection after response. Client reads response until EOF.
+REQUEST = \
+    b'GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'
+
+
+def hello(request):
+    return 'hello wind!'
+
+
+def serve(loop_factory, port):
+    from wind.web.httpserver import HTTPServer
+    if loop_factory is not None:
+        import asyncio
+        from wind.aio import AsyncioReactor
+        loop = loop_factory()
+        asyncio.set_event_loop(loop)
+        AsyncioReactor(loop=loop).install()
+    # Silence access log while benchmarking.
+    import logging
+    logging.getLogger('wind.access').disabled = True
+    app = WindApp([path(hello, route='/', methods=['get'])])
+    HTTPServer(app=app).run_simple('127.0.0.1', port)
+
+
+def request(port):
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall(REQUEST)
+    while sock.recv(4096):
+        pass
+    sock.close()
+
+
+def measure(loop_factory, port):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve(loop_factory, port)
+        finally:
+            os._exit(0)
+
+    # Wait for server to listen.
+    for _ in range(100):
+        try:
+            request(port)
+            break
+        except socket.error:
+            time.sleep(0.05)
+
+    def client(count):
+        for _ in range(count):
+            request(port)
+
+    threads = [
+        threading.Thread(target=client, args=(REQUESTS // CONCURRENCY,))
+        for _ in range(CONCURRENCY)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+    return REQUESTS // CONCURRENCY * CONCURRENCY / elapsed
+
+
+def main():
+    import asyncio
+    loops = [
+        ('PollReactor', None),
+        ('asyncio', asyncio.new_event_loop),
+    ]
+    try:
+        import uvloop
+        loops.append(('uvloop', uvloop.new_event_loop))
+    except ImportError:
+        pass
+
+    # Results depend on interpreter, so report which one ran them.
+    sys.stdout.write('%s %s\n' % (
+        platform.python_implementation(), platform.python_version()))
+    for i, (name, loop_factory) in enumerate(loops):
+        sys.stdout.write(
+            '%-12s %10.1f req/s\n' % (name, measure(loop_factory, PORT + i)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# Copyright (c) 2014 Park Ilsu. See LICENSE for details.
+
+"""Benchmark for event dispatch in `PollReactor`.
+
+Compares dispatch core of reactor with the previous one which copied poll
+results into `Dict`, popped them one by one and looked up handler `Dict`.
+Fake driver is used, so any number of fds can be registered without
+opening real sockets.
+
+    $ PYTHONPATH=. python benchmarks/reactor_dispatch.py
+
+"""
+
+import sys
+import random
+import timeit
+import platform
+
+from wind.driver import BaseDriver
+from wind.reactor import PollReactor
+
+FD_COUNTS = [1000, 10000, 50000]
+# Fraction of registered fds reported ready in one poll.
+ACTIVE_RATIO = 0.1
+REPEAT = 5
+
+
+class FakeDriver(BaseDriver):
+    """Driver observing nothing. It only remembers registered fds"""
+    def __init__(self):
+        self._driver = self
+
+    def register(self, fd, event_mask):
+        pass
+
+    def unregister(self, fd):
+        pass
+
+    def modify(self, fd, event_mask):
+        pass
+
+    def poll(self, poll_timeout):
+        return []
+
+
+class LegacyDispatcher(object):
+    """Dispatch loop of reactor before fd-indexed handler table"""
+    def __init__(self):
+        self._handlers = {}
+        self._events = {}
+
+    def attach_handler(self, fd, event_mask, handler):
+        self._handlers[fd] = handler
+
+    def _dispatch(self, events):
+        self._events.update(events)
+        while self._events:
+            fd, event_mask = self._events.popitem()
+            handler = self._handlers.get(fd, None)
+            if handler is None:
+                pass
+            try:
+                handler(fd, event_mask)
+            except TypeError:
+                raise
+
+
+def handler(fd, event_mask):
+    pass
+
+
+def measure(dispatcher, num_fds):
+    # Skip fds used by reactor itself.
+    fds = range(64, 64 + num_fds)
+    for fd in fds:
+        dispatcher.attach_handler(fd, 1, handler)
+    active = random.sample(fds, int(num_fds * ACTIVE_RATIO))
+    events = [(fd, 1) for fd in active]
+
+    number = max(1, 200000 // len(events))
+    best = min(timeit.repeat(
+        lambda: dispatcher._dispatch(events), number=number, repeat=REPEAT))
+    return len(events) * number / best
+
+
+def main():
+    # Results depend on interpreter, so report which one ran them.
+    sys.stdout.write('%s %s\n' % (
+        platform.python_implementation(), platform.python_version()))
+    sys.stdout.write('%8s %16s %16s %8s\n' % (
+        'fds', 'before(ev/s)', 'after(ev/s)', 'ratio'))
+    for num_fds in FD_COUNTS:
+        before = measure(LegacyDispatcher(), num_fds)
+        after = measure(PollReactor(driver=FakeDriver()), num_fds)
+        sys.stdout.write('%8d %16d %16d %7.2fx\n' % (
+            num_fds, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+
+    wind.aio
+    ~~~~~~~~
+
+    Interoperability with `asyncio`. (Python 3.4 and newer)
+
+    There are two ways to use `asyncio` with wind.
+
+    1. Run wind on top of `asyncio` event loop with `AsyncioReactor`.
+       Streams and servers register their fds with loop readers and writers,
+       so wind and `asyncio` libraries share one loop.
+
+            reactor = AsyncioReactor(loop=asyncio.new_event_loop())
+            reactor.install()
+            HTTPServer(app=app).run_simple('127.0.0.1', 9000)
+
+    2. Keep native `PollReactor` and bridge coroutines into it with
+       `run_coroutine`. Coroutines run on `asyncio` loop in background
+       thread, and result is marshalled back to reactor thread.
+
+            future = run_coroutine(fetch_user(user_id))
+            future.add_done_callback(on_user)
+
+"""
+
+import asyncio
+import threading
+
+from wind.driver import BaseDriver, PollEvents
+from wind.concurrency import Future
+from wind.exceptions import ReactorError
+from wind.reactor import PollReactor, HandlerRecord, Timer
+
+
+class AsyncioReactor(PollReactor):
+    """Reactor running on top of `asyncio` event loop.
+    It provides same interface as `PollReactor`, but io events, timers and
+    callbacks are handled by `asyncio` loop.
+
+    Methods for the caller.
+
+    - __init__(loop=None)
+    - install()
+    - loop
+
+    """
+    def __init__(self, loop=None):
+        """Initialize reactor with `asyncio` loop.
+
+        @param loop(optional): `asyncio` event loop.
+        By default, current event loop is used.
+        """
+        self._loop = loop or asyncio.get_event_loop()
+        # There's no driver to poll because `asyncio` loop does it.
+        super(AsyncioReactor, self).__init__(driver=BaseDriver())
+
+    def initialize(self):
+        """`asyncio` loop wakes up by itself, so heartbeat is not needed"""
+        pass
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def install(self):
+        """Make this reactor singleton returned by `Reactor.instance()`.
+        Should be called before any stream or server is created.
+
+        """
+        with PollReactor._singleton_lock:
+            if PollReactor.exist():
+                raise ReactorError('`Reactor` is already initialized')
+            PollReactor._instance = self
+        return self
+
+    @property
+    def edge_triggered(self):
+        return False
+
+    @property
+    def oneshot(self):
+        return False
+
+    def attach_handler(self, fd, event_mask, handler):
+        """Attach event handler to given fd with loop readers and writers"""
+        if self.handler_record(fd) is not None:
+            raise ReactorError('Fd %d already registered' % fd)
+        handlers = self._handlers
+        size = len(handlers)
+        if fd >= size:
+            handlers.extend([None] * max(fd + 1 - size, size))
+        # `event_mask` of record is mask observed by loop now.
+        record = handlers[fd] = HandlerRecord(fd, 0, handler)
+        self._watch(record, event_mask)
+
+    def update_handler(self, fd, event_mask):
+        record = self.handler_record(fd)
+        if record is None:
+            raise ReactorError('Fd %d is not registered' % fd)
+        self._watch(record, event_mask)
+
+    def remove_handler(self, fd):
+        record = self.handler_record(fd)
+        if record is not None:
+            self._watch(record, 0)
+            self._handlers[fd] = None
+
+    def _watch(self, record, event_mask):
+        """Add or remove loop reader and writer of `record.fd` depending on
+        difference between `event_mask` and currently observed events.
+
+        """
+        fd, handler = record.fd, record.handler
+        changed = record.event_mask ^ event_mask
+        if changed & PollEvents.READ:
+            if event_mask & PollEvents.READ:
+                self._loop.add_reader(fd, handler, fd, PollEvents.READ)
+            else:
+                self._loop.remove_reader(fd)
+        if changed & PollEvents.WRITE:
+            if event_mask & PollEvents.WRITE:
+                self._loop.add_writer(fd, handler, fd, PollEvents.WRITE)
+            else:
+                self._loop.remove_writer(fd)
+        record.event_mask = event_mask
+
+    def attach_callback(self, callback):
+        """Attach callback to loop. This method is thread-safe."""
+        self._loop.call_soon_threadsafe(self._safe_run, callback)
+
+    def time(self):
+        return self._loop.time()
+
+    def call_at(self, deadline, callback, *args):
+        if not hasattr(callback, '__call__'):
+            raise ReactorError('Timer callback is not callable')
+        timer = _AsyncioTimer(self, deadline, callback, args)
+        timer.handle = self._loop.call_at(deadline, self._run_timer, timer)
+        return timer
+
+    def cancel_timer(self, timer):
+        if timer.cancelled:
+            return
+        timer.cancelled = True
+        timer.callback = timer.args = None
+        timer.handle.cancel()
+
+    def _run_timer(self, timer):
+        callback, args = timer.callback, timer.args
+        timer.cancelled = True
+        timer.callback = timer.args = None
+        self._safe_run(callback, *args)
+
+    def run(self, poll_timeout=None):
+        """Run `asyncio` loop until `stop` is called"""
+        self._running = True
+        try:
+            self._loop.run_forever()
+        finally:
+            self._running = False
+
+    def stop(self):
+        self._running = False
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class _AsyncioTimer(Timer):
+    __slots__ = ('handle',)
+
+
+class AsyncioBridge(object):
+    """Runs `asyncio` loop in background thread for native reactor.
+    Coroutines submitted to bridge run on that loop, and `Future` returned
+    by `submit` is completed in reactor thread.
+
+    Methods for the caller.
+
+    - __init__(reactor=None, loop=None)
+    - submit(coro)
+    - stop()
+
+    """
+    def __init__(self, reactor=None, loop=None):
+        self._reactor = reactor or PollReactor.instance()
+        self._loop = loop or asyncio.new_event_loop()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule `coro` on `asyncio` loop and returns `Future`"""
+        self._start()
+        future = Future()
+        concurrent = asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+        def marshal(concurrent):
+            self._reactor.attach_callback(
+                lambda: _copy_state(concurrent, future))
+
+        concurrent.add_done_callback(marshal)
+        return future
+
+    def stop(self):
+        """Stop `asyncio` loop and wait for background thread"""
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+
+def _copy_state(source, future):
+    """Complete wind `Future` with state of `asyncio` or concurrent future"""
+    if source.cancelled():
+        future.set_exception(ReactorError('Coroutine was cancelled'))
+    elif source.exception() is not None:
+        future.set_exception(source.exception())
+    else:
+        future.set_result(source.result())
+
+
+def run_coroutine(coro, reactor=None):
+    """Run `asyncio` coroutine for reactor and returns `Future` completed
+    in reactor thread.
+    If reactor is `AsyncioReactor`, coroutine runs on its own loop.
+    Otherwise, it runs on `AsyncioBridge` of reactor.
+
+    """
+    reactor = reactor or PollReactor.instance()
+    if isinstance(reactor, AsyncioReactor):
+        future = Future()
+        task = asyncio.ensure_future(coro, loop=reactor.loop)
+        task.add_done_callback(lambda task: _copy_state(task, future))
+        return future
+
+    if reactor._asyncio_bridge is None:
+        reactor._asyncio_bridge = AsyncioBridge(reactor=reactor)
+    return reactor._asyncio_bridge.submit(coro)
@@ -8,6 +8,8 @@
 """
 
 import sys
+import time
+import inspect
 
 ver = sys.version_info
 
@@ -18,9 +20,25 @@ if is_py2:
     unicode = unicode
     basestring = basestring
     from urlparse import urlparse, parse_qsl
+    from thread import get_ident
+    from Queue import Queue
+    from httplib import responses
+    from collections import MutableMapping
 
 
 elif is_py3:
     unicode = str
     basestring = (str, bytes)
     from urllib.parse import urlparse, parse_qsl
+    from threading import get_ident
+    from queue import Queue
+    from http.client import responses
+    from collections.abc import MutableMapping
+
+
+# Clock for scheduling. `time.monotonic` is not affected by system clock
+# updates, but it is only available in Python 3.3 and newer.
+monotonic = getattr(time, 'monotonic', time.time)
+
+# Native coroutine created by `async def` (Python 3.5 and newer).
+iscoroutine = getattr(inspect, 'iscoroutine', lambda obj: False)
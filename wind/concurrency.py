@@ -9,9 +9,16 @@
 
 import os
 import sys
+import array
+import errno
+import pickle
 import signal
+import socket
+import struct
+import threading
 import itertools
 from multiprocessing import cpu_count
+from wind.compat import Queue
 from wind.exceptions import ConcurrencyError
 
 
@@ -121,5 +128,615 @@ def start_workers(num_workers=None):
     main_process.wait()
 
 
+class Future(object):
+    """Result of asynchronous operation which will be completed later.
+    `Future` is not thread-safe. It should be completed in reactor thread,
+    then done callbacks run in reactor thread as well.
+
+    Methods for the caller:
+
+    - done()
+    - result()
+    - exception()
+    - add_done_callback(callback)
+    - set_result(result)
+    - set_exception(exception)
+
+    """
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        """Returns result or raise exception of completed operation"""
+        if not self._done:
+            raise ConcurrencyError('Future is not completed yet')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        if not self._done:
+            raise ConcurrencyError('Future is not completed yet')
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """Run `callback` with this future when it is completed.
+        If it is already completed, `callback` runs immediately.
+
+        """
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def set_result(self, result=None):
+        self._complete(result, None)
+
+    def set_exception(self, exception):
+        self._complete(None, exception)
+
+    def _complete(self, result, exception):
+        if self._done:
+            raise ConcurrencyError('Future is already completed')
+        self._result = result
+        self._exception = exception
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def __await__(self):
+        """Make future awaitable in coroutine driven by `Task`"""
+        return _FutureIterator(self)
+
+    __iter__ = __await__
+
+    def __repr__(self):
+        state = 'done' if self._done else 'pending'
+        return '<Future [%s]>' % state
+
+
+class _FutureIterator(object):
+    """Iterator returned from `Future.__await__`.
+    It yields future to `Task` once if future is pending, then finishes with
+    result of future. This is a plain iterator instead of generator, so it
+    doesn't need `return` with value in generator.
+
+    """
+    def __init__(self, future):
+        self._future = future
+        self._yielded = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    next = __next__
+
+    def send(self, value):
+        if not self._yielded and not self._future.done():
+            self._yielded = True
+            return self._future
+        raise StopIteration(self._future.result())
+
+    def throw(self, type_, value=None, traceback_=None):
+        if value is None:
+            value = type_() if isinstance(type_, type) else type_
+        raise value
+
+
+class Task(Future):
+    """`Future` driving coroutine which awaits only `Future`.
+    Coroutine is resumed in done callback of awaited future. Futures of
+    wind are completed in reactor thread, so coroutine always runs in
+    reactor thread without any extra scheduling.
+    Coroutine starts running as soon as task is created.
+
+    """
+    def __init__(self, coro):
+        super(Task, self).__init__()
+        self._coro = coro
+        self._step()
+
+    def _step(self, value=None, exception=None):
+        while True:
+            try:
+                if exception is not None:
+                    awaited = self._coro.throw(exception)
+                else:
+                    awaited = self._coro.send(value)
+            except StopIteration as e:
+                self.set_result(getattr(e, 'value', None))
+                return
+            except Exception as e:
+                self.set_exception(e)
+                return
+
+            if not isinstance(awaited, Future):
+                value, exception = None, ConcurrencyError(
+                    'Coroutine can only await `Future`, not %r' % awaited)
+                continue
+            if not awaited.done():
+                awaited.add_done_callback(self._wakeup)
+                return
+            # Already completed. Resume without growing stack.
+            value, exception = self._outcome(awaited)
+
+    def _wakeup(self, future):
+        self._step(*self._outcome(future))
+
+    def _outcome(self, future):
+        exception = future.exception()
+        if exception is not None:
+            return None, exception
+        return future.result(), None
+
+    def __repr__(self):
+        state = 'done' if self._done else 'pending'
+        return '<Task [%s]>' % state
+
+
+class ThreadPool(object):
+    """Bounded pool of threads running blocking jobs off the reactor.
+    Result of job is marshalled back to reactor thread through
+    `attach_callback`, so `Future` is always completed in reactor thread.
+    Threads are spawned lazily. Spawn them after `start_workers` because
+    threads are not inherited by forked process.
+
+    Methods for the caller:
+
+    - __init__(reactor, max_workers=None, max_pending=None)
+    - submit(func, *args, **kwargs)
+    - stats()
+    - shutdown()
+
+    """
+    def __init__(self, reactor, max_workers=None, max_pending=None):
+        """Initialize thread pool.
+
+        @param reactor: reactor which completes futures.
+        @param max_workers(optional): max number of threads.
+        By default, 4 times number of cpu cores.
+        @param max_pending(optional): max number of jobs waiting for thread.
+        If exceeded, `submit` raises `ConcurrencyError`. Unbounded if None.
+        """
+        self._reactor = reactor
+        self._max_workers = max_workers or cpu_count() * 4
+        self._max_pending = max_pending
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._idle = 0
+        # Jobs submitted but not taken by thread yet.
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._shutdown = False
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    @property
+    def queue_depth(self):
+        """Number of jobs waiting for thread"""
+        return self._queue.qsize()
+
+    @property
+    def active(self):
+        """Number of threads running job"""
+        return self._active
+
+    @property
+    def saturation(self):
+        """Ratio of busy threads to `max_workers`"""
+        return float(self._active) / self._max_workers
+
+    def stats(self):
+        """Returns `Dict` of metrics of this pool"""
+        return {
+            'workers': len(self._threads),
+            'max_workers': self._max_workers,
+            'active': self._active,
+            'queue_depth': self.queue_depth,
+            'saturation': self.saturation,
+            'completed': self._completed,
+            'rejected': self._rejected,
+        }
+
+    def submit(self, func, *args, **kwargs):
+        """Run `func` with args in pool and returns `Future` of it."""
+        if self._shutdown:
+            raise ConcurrencyError('Cannot submit job to shut down pool')
+        if self._max_pending is not None and \
+                self.queue_depth >= self._max_pending:
+            self._rejected += 1
+            raise ConcurrencyError('Thread pool is saturated')
+
+        future = Future()
+        with self._lock:
+            self._pending += 1
+            # Idle thread may not have taken previous jobs yet.
+            spawn = self._pending > self._idle and \
+                len(self._threads) < self._max_workers
+        self._queue.put((future, func, args, kwargs))
+        if spawn:
+            self._spawn()
+        return future
+
+    def shutdown(self):
+        """Stop all threads after pending jobs are done"""
+        self._shutdown = True
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def _spawn(self):
+        thread = threading.Thread(target=self._work)
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._idle += 1
+            job = self._queue.get()
+            with self._lock:
+                self._idle -= 1
+                if job is not None:
+                    self._pending -= 1
+            if job is None:
+                break
+
+            future, func, args, kwargs = job
+            with self._lock:
+                self._active += 1
+            result = exception = None
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                # `SystemExit` of job should not kill thread and leave
+                # future pending.
+                exception = e
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+            self._reactor.attach_callback(
+                lambda f=future, r=result, e=exception: f._complete(r, e))
+
+
+# Pickle protocol 5 (Python 3.8 and newer) can pass large buffers like
+# `bytearray` or `pickle.PickleBuffer` out-of-band, without copying them
+# into pickled stream.
+_PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+# Header of message: number of out-of-band buffers and length of pickle.
+_MESSAGE_HEADER = struct.Struct('!IQ')
+_BUFFER_HEADER = struct.Struct('!Q')
+# Pid of process sent by fork helper along with its socket.
+_PID = struct.Struct('!I')
+_FD_ARRAY_ITEMSIZE = array.array('i').itemsize
+
+
+def send_message(socket_, obj):
+    """Pickle `obj` and send it to blocking `socket_`.
+    Out-of-band buffers are sent from their own memory after pickle, so
+    large payload is never copied into pickled stream.
+
+    """
+    buffers = []
+    if _PICKLE_PROTOCOL >= 5:
+        data = pickle.dumps(
+            obj, protocol=_PICKLE_PROTOCOL, buffer_callback=buffers.append)
+    else:
+        data = pickle.dumps(obj, protocol=_PICKLE_PROTOCOL)
+    raws = [buffer_.raw() for buffer_ in buffers]
+    header = _MESSAGE_HEADER.pack(len(raws), len(data)) + b''.join(
+        _BUFFER_HEADER.pack(raw.nbytes) for raw in raws)
+    socket_.sendall(header + data)
+    for raw in raws:
+        socket_.sendall(raw)
+
+
+def recv_message(socket_):
+    """Receive message sent by `send_message` from blocking `socket_`.
+    Out-of-band buffers are received directly into preallocated
+    `bytearray`. Raises `EOFError` if peer is closed.
+
+    """
+    num_buffers, data_size = _MESSAGE_HEADER.unpack(
+        _recv_exactly(socket_, _MESSAGE_HEADER.size))
+    sizes = [
+        _BUFFER_HEADER.unpack(_recv_exactly(socket_, _BUFFER_HEADER.size))[0]
+        for _ in range(num_buffers)]
+    data = _recv_exactly(socket_, data_size)
+    buffers = [_recv_exactly(socket_, size) for size in sizes]
+    if buffers:
+        return pickle.loads(data, buffers=buffers)
+    return pickle.loads(data)
+
+
+def _recv_exactly(socket_, size):
+    buffer_ = bytearray(size)
+    view = memoryview(buffer_)
+    while size:
+        try:
+            num_bytes = socket_.recv_into(view, size)
+        except socket.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if num_bytes == 0:
+            raise EOFError('Peer closed while receiving message')
+        view = view[num_bytes:]
+        size -= num_bytes
+    return buffer_
+
+
+class ProcessPool(object):
+    """Pool of forked processes running CPU-bound jobs of one worker.
+    Each process is served by a thread of this pool, which sends job with
+    `send_message` and waits for result. Result is marshalled back to
+    reactor thread through `attach_callback`, so `Future` is always
+    completed in reactor thread.
+    Processes are forked by helper process, which is forked by `start`.
+    Helper is single-threaded, so processes never inherit locks held by
+    other threads of this process, even when process died while running
+    job is replaced later.
+    NOTE that `start` should be called before any thread is started,
+    including threads of other pools and `asyncio` bridge. Otherwise it
+    is called at first `submit`, and helper itself may inherit held locks.
+    Job function and arguments should be picklable. Pass large payload as
+    `bytearray` or `pickle.PickleBuffer` so that it goes out-of-band.
+    NOTE that this class only works in `Unix` based system like `Process`.
+
+    Methods for the caller:
+
+    - __init__(reactor, num_processes=None)
+    - start()
+    - submit(func, *args, **kwargs)
+    - stats()
+    - shutdown()
+
+    """
+    def __init__(self, reactor, num_processes=None):
+        """Initialize process pool. Processes are forked at first `submit`.
+
+        @param reactor: reactor which completes futures.
+        @param num_processes(optional): number of processes.
+        By default, number of cpu cores.
+        """
+        self._reactor = reactor
+        self._num_processes = num_processes or cpu_count()
+        self._queue = Queue()
+        self._threads = []
+        self._pids = set()
+        self._lock = threading.Lock()
+        # (pid, socket) of helper forking processes.
+        self._forker = None
+        self._fork_lock = threading.Lock()
+        self._active = 0
+        self._completed = 0
+        self._shutdown = False
+
+    @property
+    def queue_depth(self):
+        """Number of jobs waiting for process"""
+        return self._queue.qsize()
+
+    @property
+    def active(self):
+        """Number of processes running job"""
+        return self._active
+
+    def stats(self):
+        """Returns `Dict` of metrics of this pool"""
+        return {
+            'processes': len(self._pids),
+            'max_processes': self._num_processes,
+            'active': self._active,
+            'queue_depth': self.queue_depth,
+            'saturation': float(self._active) / self._num_processes,
+            'completed': self._completed,
+        }
+
+    def submit(self, func, *args, **kwargs):
+        """Run `func` with args in pool and returns `Future` of it."""
+        if self._shutdown:
+            raise ConcurrencyError('Cannot submit job to shut down pool')
+
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        if not self._threads:
+            # Helper should be forked before threads of pool start.
+            self.start()
+            for _ in range(self._num_processes):
+                self._start_thread(*self._fork())
+        return future
+
+    def start(self):
+        """Fork helper process which forks processes of this pool.
+        Does nothing if helper is already forked.
+
+        """
+        with self._fork_lock:
+            if self._forker is not None or self._shutdown:
+                return
+            parent, child = socket.socketpair()
+            pid = os.fork()
+            if pid == 0:
+                parent.close()
+                self._run_forker(child)
+            child.close()
+            self._forker = (pid, parent)
+
+    def shutdown(self):
+        """Stop all processes after pending jobs are done"""
+        self._shutdown = True
+        for _ in self._threads:
+            self._queue.put(None)
+        with self._fork_lock:
+            if self._forker is not None:
+                pid, socket_ = self._forker
+                self._forker = None
+                # Helper exits when its socket is closed.
+                socket_.close()
+                try:
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+
+    def _start_thread(self, pid, socket_):
+        thread = threading.Thread(target=self._work, args=(pid, socket_))
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+
+    def _replace(self):
+        """Fork process replacing dead one. Runs in reactor thread."""
+        if not self._shutdown:
+            self._start_thread(*self._fork())
+
+    def _fork(self):
+        """Let helper fork new process and returns (pid, socket) to talk
+        with it.
+
+        """
+        with self._fork_lock:
+            if self._forker is None:
+                raise ConcurrencyError('Fork helper is not running')
+            forker = self._forker[1]
+            try:
+                forker.sendall(b'f')
+                data, ancdata, _, _ = forker.recvmsg(
+                    _PID.size, socket.CMSG_LEN(_FD_ARRAY_ITEMSIZE))
+            except socket.error as e:
+                raise ConcurrencyError('Fork helper is broken: %s' % e)
+        if len(data) != _PID.size or not ancdata:
+            raise ConcurrencyError('Fork helper died')
+        pid = _PID.unpack(data)[0]
+        fds = array.array('i')
+        fds.frombytes(ancdata[0][2][:_FD_ARRAY_ITEMSIZE])
+        with self._lock:
+            self._pids.add(pid)
+        return pid, socket.socket(fileno=fds[0])
+
+    def _run_forker(self, socket_):
+        """Main loop of helper process. Forks process for each request
+        and sends pid and socket of it back. Never returns.
+
+        """
+        fd = socket_.fileno()
+        os.closerange(3, fd)
+        os.closerange(fd + 1, _MAX_FD)
+        # Processes are not children of pool, so kernel reaps them.
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        code = 0
+        try:
+            while socket_.recv(1):
+                parent, child = socket.socketpair()
+                pid = os.fork()
+                if pid == 0:
+                    socket_.close()
+                    parent.close()
+                    self._serve(child)
+                child.close()
+                socket_.sendmsg(
+                    [_PID.pack(pid)],
+                    [(socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                      array.array('i', [parent.fileno()]))])
+                parent.close()
+        except Exception:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _serve(self, socket_):
+        """Main loop of forked process. Never returns."""
+        # Forked process should not touch fds of server.
+        fd = socket_.fileno()
+        os.closerange(3, fd)
+        os.closerange(fd + 1, _MAX_FD)
+        code = 0
+        try:
+            while True:
+                try:
+                    func, args, kwargs = recv_message(socket_)
+                except (EOFError, socket.error):
+                    break
+                except Exception as e:
+                    # Whole message is received, so next one can be read.
+                    reply = (False, ConcurrencyError(
+                        'Cannot unpickle job: %s' % e))
+                else:
+                    try:
+                        reply = (True, func(*args, **kwargs))
+                    except Exception as e:
+                        reply = (False, e)
+                try:
+                    send_message(socket_, reply)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    send_message(socket_, (False, ConcurrencyError(
+                        'Cannot pickle result of job: %s' % e)))
+        except Exception:
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _work(self, pid, socket_):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            future, func, args, kwargs = job
+            with self._lock:
+                self._active += 1
+            died = False
+            try:
+                send_message(socket_, (func, args, kwargs))
+                success, value = recv_message(socket_)
+            except (EOFError, socket.error):
+                died = True
+                success, value = False, ConcurrencyError(
+                    'Process %d died while running job' % pid)
+            except Exception as e:
+                # Message is pickled before it's sent and unpickled after
+                # it's received, so process can take next job.
+                success, value = False, ConcurrencyError(
+                    'Cannot pickle job or its result: %s' % e)
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+            self._reactor.attach_callback(
+                lambda f=future, s=success, v=value:
+                    f.set_result(v) if s else f.set_exception(v))
+            if died:
+                # Process is replaced with thread serving it.
+                self._reactor.attach_callback(self._replace)
+                break
+        self._reap(pid, socket_)
+
+    def _reap(self, pid, socket_):
+        # Process exits when its socket is closed, and helper reaps it.
+        socket_.close()
+        with self._lock:
+            self._pids.discard(pid)
+
+
+try:
+    _MAX_FD = os.sysconf('SC_OPEN_MAX')
+except (AttributeError, ValueError):
+    _MAX_FD = 256
+
+
 _current_process = MainProcess()
 del MainProcess
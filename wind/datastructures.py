@@ -7,7 +7,9 @@
 
 """
 
+import re
 import collections
+from wind.compat import MutableMapping
 
 
 class FlexibleDeque(collections.deque):
@@ -77,7 +79,250 @@ class FlexibleDeque(collections.deque):
         return '%s(%s)' % (name, str(list(self)))
 
 
-class FlexibleDict(collections.MutableMapping):
+class BufferPool(object):
+    """Pool of reusable `bytearray` for receiving data with `recv_into`.
+    Buffers are grouped by size, rounded up to power of two.
+
+        >>> pool = BufferPool()
+        >>> buffer_ = pool.acquire(3000)
+        >>> len(buffer_)
+        4096
+        >>> pool.release(buffer_)
+
+    Buffer is reused only if nobody holds `memoryview` of it any more,
+    so it's safe to release buffer whose slices are still in use.
+
+    Methods for the caller:
+
+    - __init__(max_buffers=64)
+    - acquire(size)
+    - release(buffer_)
+
+    """
+    def __init__(self, max_buffers=64):
+        """@param max_buffers(optional): max buffers kept for each size."""
+        self._max_buffers = max_buffers
+        # Dict of size -> list of free `bytearray`.
+        self._free = {}
+
+    def acquire(self, size):
+        """Returns `bytearray` which length is at least `size`"""
+        capacity = 1
+        while capacity < size:
+            capacity <<= 1
+        free = self._free.get(capacity)
+        if free:
+            return free.pop()
+        return bytearray(capacity)
+
+    def release(self, buffer_):
+        """Return `buffer_` acquired by `acquire` to pool"""
+        try:
+            # Resizing fails if `memoryview` of buffer is alive.
+            buffer_.append(0)
+        except BufferError:
+            return
+        del buffer_[-1]
+        free = self._free.setdefault(len(buffer_), [])
+        if len(free) < self._max_buffers:
+            free.append(buffer_)
+
+
+class ChunkBuffer(object):
+    """Rope of `bytes` or `memoryview` chunks.
+    Chunks are never joined until they are consumed, and consumed bytes
+    are only skipped by offset in first chunk.
+
+        >>> buffer_ = ChunkBuffer()
+        >>> buffer_.append(b'y-comb')
+        >>> buffer_.append(b'inator')
+        >>> buffer_.find(b'bin')
+        4
+        >>> buffer_.consume(4)
+        b'y-co'
+
+    Methods for the caller:
+
+    - __init__(pool=None)
+    - __len__()
+    - append(chunk)
+    - find(delimiter)
+    - consume(num_bytes)
+    - clear()
+
+    """
+    def __init__(self, pool=None):
+        """@param pool(optional): `BufferPool` to which buffers of
+        consumed `memoryview` chunks are returned.
+        """
+        self._pool = pool
+        self._chunks = collections.deque()
+        # Bytes of first chunk already consumed.
+        self._offset = 0
+        self._size = 0
+        # Buffers of whole chunks returned by `consume`. They are released
+        # later, after caller has dropped its `memoryview` of them.
+        self._lent = []
+        self._reset_scan()
+
+    def __len__(self):
+        return self._size
+
+    def _reset_scan(self):
+        """Saved state of last `find`. Positions are relative to
+        first unconsumed byte, so first chunk starts at `-_offset`.
+
+        """
+        self._scan_delimiter = None
+        self._scan_index = 0
+        self._scan_start = -self._offset
+        self._scan_pos = 0
+
+    def append(self, chunk):
+        if chunk:
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+
+    def find(self, delimiter):
+        """Returns position of first `delimiter` in buffer or `-1`.
+        Search resumes where last search of same delimiter stopped,
+        so data trickling in is scanned only once.
+
+        """
+        width = len(delimiter)
+        chunks = self._chunks
+        if self._scan_delimiter == delimiter:
+            index, start = self._scan_index, self._scan_start
+            pos = self._scan_pos
+        else:
+            index, start, pos = 0, -self._offset, 0
+
+        while index < len(chunks):
+            chunk = chunks[index]
+            end = start + len(chunk)
+            found = _find(chunk, delimiter, max(pos - start, 0))
+            if found != -1:
+                return start + found
+
+            # Delimiter may cross boundary of chunks.
+            seam = max(pos, end - width + 1)
+            if seam < end:
+                wanted = end - seam + width - 1
+                window = self._bytes_at(index, seam - start, wanted)
+                found = window.find(delimiter)
+                if found != -1:
+                    return seam + found
+                if len(window) < wanted:
+                    # Delimiter may start in bytes not received yet.
+                    pos = max(seam, self._size - width + 1)
+                    break
+            pos = end
+            index += 1
+            start = end
+
+        self._scan_delimiter = delimiter
+        self._scan_index, self._scan_start = index, start
+        self._scan_pos = pos
+        return -1
+
+    def _bytes_at(self, index, begin, num_bytes):
+        """Returns at most `num_bytes` bytes from `begin` of chunk `index`"""
+        pieces = []
+        chunks = self._chunks
+        while num_bytes > 0 and index < len(chunks):
+            piece = chunks[index][begin:begin + num_bytes]
+            pieces.append(piece)
+            num_bytes -= len(piece)
+            index += 1
+            begin = 0
+        return b''.join(pieces)
+
+    def consume(self, num_bytes):
+        """Remove `num_bytes` bytes from front and returns them.
+        Returns slice of first chunk without copying if it has enough bytes.
+        Otherwise, returns joined `bytes`.
+
+        """
+        if self._lent:
+            lent, self._lent = self._lent, []
+            self._release(lent)
+        chunks = self._chunks
+        num_bytes = min(num_bytes, self._size)
+        if not num_bytes:
+            return b''
+        self._size -= num_bytes
+        first = chunks[0]
+        offset = self._offset
+        remain = len(first) - offset
+        if remain > num_bytes:
+            self._offset += num_bytes
+            chunk = first[offset:offset + num_bytes]
+        elif remain == num_bytes and offset == 0:
+            chunk = chunks.popleft()
+            if isinstance(chunk, memoryview):
+                self._lent.append(chunk.obj)
+        else:
+            pieces = []
+            consumed = []
+            while num_bytes:
+                first = chunks[0]
+                remain = len(first) - self._offset
+                if remain > num_bytes:
+                    pieces.append(
+                        first[self._offset:self._offset + num_bytes])
+                    self._offset += num_bytes
+                    break
+                pieces.append(first[self._offset:])
+                chunks.popleft()
+                if isinstance(first, memoryview):
+                    consumed.append(first.obj)
+                self._offset = 0
+                num_bytes -= remain
+            del first
+            chunk = b''.join(pieces)
+            del pieces
+            # Buffers can be reused now that nothing refers to them.
+            self._release(consumed)
+        self._reset_scan()
+        return chunk
+
+    def _release(self, buffers):
+        if self._pool is not None:
+            for buffer_ in buffers:
+                self._pool.release(buffer_)
+
+    def clear(self):
+        buffers = [chunk.obj for chunk in self._chunks
+                   if isinstance(chunk, memoryview)] + self._lent
+        self._lent = []
+        self._chunks.clear()
+        self._offset = self._size = 0
+        self._reset_scan()
+        self._release(buffers)
+
+
+def _find(chunk, delimiter, start=0):
+    """`find` for `bytes` and `memoryview`"""
+    if not isinstance(chunk, memoryview):
+        return chunk.find(delimiter, start)
+    # `re` searches `memoryview` without copying it.
+    match = _delimiter_pattern(delimiter).search(chunk, start)
+    return -1 if match is None else match.start()
+
+
+def _delimiter_pattern(delimiter):
+    pattern = _delimiter_patterns.get(delimiter)
+    if pattern is None:
+        pattern = re.compile(re.escape(delimiter))
+        _delimiter_patterns[delimiter] = pattern
+    return pattern
+
+
+# Compiled patterns of delimiters searched in `memoryview`.
+_delimiter_patterns = {}
+
+
+class FlexibleDict(MutableMapping):
     """Provides flexible transformations to dict `key`"""
     def __init__(self, dict_=None):
         # `_store` stores (key, value) tuple on each key.
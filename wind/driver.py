@@ -12,18 +12,25 @@ from itertools import chain
 from wind.exceptions import PollError, WindException
 
 
-def pick():
+def pick(edge_triggered=False, oneshot=False):
     """Pick best event driver depending on OS.
     `Select`, `Poll` are available in most OS.
     `Epoll` is available on Linux 2.5.44 and newer.
     `KQueue` is available on most BSD.
 
+    @param edge_triggered(optional): use edge-triggered mode if picked
+    driver supports it. (Only `Epoll` for now)
+    @param oneshot(optional): disable fd after each event until it is
+    re-armed with `modify`. (Only `Epoll` for now)
     """
     try:
         candidates = ['select', 'poll', 'epoll', 'kqueue']
         # Cast result of `filter` because `filter` no longer returns
         # `list` in Python 3.x
         driver = list(filter(lambda x: hasattr(select, x), candidates))[-1]
+        if driver == 'epoll':
+            return Epoll(
+                edge_triggered=edge_triggered, oneshot=oneshot).instance
         return eval(driver.title())().instance
     except (IndexError, NameError):
         raise WindException('No available event driver')
@@ -55,7 +62,17 @@ class Events(object):
 
 
 class BaseDriver(object):
-    """Forces implementation of select.epoll interface"""
+    """Forces implementation of select.epoll interface.
+
+    Drivers are level-triggered by default. If `edge_triggered` is True,
+    event is reported only when fd becomes ready, so handler should read
+    or write until `EWOULDBLOCK`. If `oneshot` is True, fd is disabled after
+    each reported event and should be re-armed by `modify`.
+
+    """
+    edge_triggered = False
+    oneshot = False
+
     def __init__(self):
         self._driver = None
 
@@ -145,13 +162,77 @@ class Select(BaseDriver):
 
 
 class Poll(BaseDriver):
+    """Wraps unix system call `poll`.
+    `select.poll` takes timeout in milliseconds while other drivers take
+    seconds, so this driver converts it before polling.
+
+    """
     def __init__(self):
-        self._driver = select.poll()
+        self._poll = select.poll()
+        self._driver = self
+
+    def register(self, fd, event_mask):
+        self._poll.register(fd, event_mask)
+
+    def unregister(self, fd):
+        self._poll.unregister(fd)
+
+    def modify(self, fd, event_mask):
+        self._poll.modify(fd, event_mask)
+
+    def poll(self, poll_timeout):
+        """Returns `List` of (fd, event) pair
+
+        @param poll_timeout: Value for poll timeout.(sec)
+        If timeout is `None`, it blocks until any event happens.
+        """
+        if poll_timeout is not None:
+            poll_timeout *= 1000
+        return self._poll.poll(poll_timeout)
 
 
 class Epoll(BaseDriver):
-    def __init__(self):
-        self._driver = select.epoll()
+    """Wraps linux system call `epoll`.
+    Supports edge-triggered(`EPOLLET`) and one-shot(`EPOLLONESHOT`) mode.
+    Mode flags are added to every registered event mask, so caller
+    doesn't need to know about them.
+
+    """
+    def __init__(self, edge_triggered=False, oneshot=False):
+        self._epoll = select.epoll()
+        self.edge_triggered = edge_triggered
+        self.oneshot = oneshot
+        self._flags = 0
+        if edge_triggered:
+            self._flags |= select.EPOLLET
+        if oneshot:
+            self._flags |= select.EPOLLONESHOT
+        self._driver = self
+
+    def close(self):
+        self._epoll.close()
+
+    def fileno(self):
+        return self._epoll.fileno()
+
+    def register(self, fd, event_mask):
+        self._epoll.register(fd, event_mask | self._flags)
+
+    def unregister(self, fd):
+        self._epoll.unregister(fd)
+
+    def modify(self, fd, event_mask):
+        self._epoll.modify(fd, event_mask | self._flags)
+
+    def poll(self, poll_timeout):
+        """Returns `List` of (fd, event) pair
+
+        @param poll_timeout: Value for epoll timeout.(sec)
+        If timeout is `None`, it blocks until any event happens.
+        """
+        if poll_timeout is None:
+            poll_timeout = -1
+        return self._epoll.poll(poll_timeout)
 
 
 class Kqueue(BaseDriver):
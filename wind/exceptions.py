@@ -52,7 +52,9 @@ class ApplicationError(WindException):
 
 class HTTPError(WindException):
     """Error for HTTP abnormal status handling"""
-    pass
+    @property
+    def status_code(self):
+        return self.args[0]
 
 
 class LoggerError(WindException):
@@ -25,7 +25,7 @@ class LogLevel():
             self.method = method
             self.code = code
     INFO = Level('info', logging.INFO)
-    WARN = Level('warn', logging.WARN)
+    WARN = Level('warning', logging.WARN)
     ERROR = Level('error', logging.ERROR)
 
 
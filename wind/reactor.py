@@ -7,12 +7,20 @@
 
 """
 
+import os
 import errno
-import socket
+import fcntl
+import heapq
 import select
+import itertools
 import threading
+import traceback
+from collections import deque
 
-from wind.exceptions import EWOULDBLOCK
+from wind.compat import monotonic, get_ident
+from wind.concurrency import Future, Task, ThreadPool, ProcessPool
+from wind.log import wind_logger, LogLevel
+from wind.exceptions import EWOULDBLOCK, ReactorError
 from wind.driver import pick, PollEvents
 
 
@@ -26,17 +34,37 @@ class PollReactor(object):
     - attach_handler()
     - update_handler()
     - remove_handler()
+    - handler_record(fd)
     - attach_callback()
-    - run(poll_timeout=500)
+    - run_in_executor(func, *args, **kwargs)
+    - set_executor(executor)
+    - run_in_process(func, *args, **kwargs)
+    - set_process_pool(pool)
+    - spawn(coro)
+    - sleep(delay)
+    - call_later(delay, callback, *args)
+    - call_at(deadline, callback, *args)
+    - cancel_timer(timer)
+    - time()
+    - run(poll_timeout=None)
     - stop()
+    - close()
 
     Methods can be overrided
 
     - initialize()
 
     """
+    # Max number of callbacks run in one iteration. Leftover callbacks are
+    # run in next iteration after polling io events without blocking.
+    callback_budget = 1024
+
     _NO_TIMEOUT = 0.0
-    _DEFAULT_POLL_TIMEOUT = 500.0
+    # `None` blocks in poll until io event happens or nearest timer expires.
+    _DEFAULT_POLL_TIMEOUT = None
+    # Cancelled timers stay in heap until the number of them exceeds both
+    # this value and a half of heap. Then heap is rebuilt at once.
+    _TIMER_COMPACT_THRESHOLD = 512
     _singleton_lock = threading.Lock()
 
     def __init__(self, driver=None):
@@ -46,10 +74,29 @@ class PollReactor(object):
 
         """
         self._running = False
-        self._handlers = {}
-        self._events = {}
+        # `List` of `HandlerRecord` indexed by fd. Kernel hands out the
+        # lowest free fd, so this table stays dense.
+        self._handlers = []
         self._driver = driver or pick()
-        self._callbacks = []
+        # `deque.append` and `deque.popleft` are atomic, so other threads
+        # can attach callback without lock while reactor is draining it.
+        self._callbacks = deque()
+        # Ident of thread running this reactor.
+        self._thread_ident = None
+        # Thread pool for blocking jobs and process pool for CPU-bound jobs.
+        # Created at first use.
+        self._executor = None
+        self._process_pool = None
+        # Thread pool running io of `FileStream`, and `AsyncioBridge` of
+        # `run_coroutine`. They are kept by reactor, so that they are shut
+        # down with it.
+        self._io_pool = None
+        self._asyncio_bridge = None
+        # Heap of (deadline, sequence, `Timer`).
+        # Sequence keeps timers having same deadline in scheduled order.
+        self._timers = []
+        self._timer_sequence = itertools.count()
+        self._cancelled_timers = 0
         self.initialize()
 
     def initialize(self):
@@ -62,28 +109,46 @@ class PollReactor(object):
 
         """
         self._heartbeat = Heartbeat()
-        self.attach_handler(
-            self._heartbeat.reader.fileno(), PollEvents.READ,
-            self._heartbeat.read_handler)
+        fd = self._heartbeat.fileno()
+
+        def read_handler(fd, event_mask):
+            self._heartbeat.end()
+            if self.oneshot:
+                self.update_handler(fd, PollEvents.READ)
+
+        self.attach_handler(fd, PollEvents.READ, read_handler)
 
     @staticmethod
     def exist():
         return hasattr(PollReactor, '_instance')
 
     @staticmethod
-    def instance():
+    def instance(driver=None):
         """Initialize singleton instance of Reactor
         with double-checked locking
 
+        @param driver(optional): driver for singleton reactor. It is used
+        only when singleton is created at the first call.
         Returns singleton reactor in `main thread`
         """
         if not PollReactor.exist():
             with PollReactor._singleton_lock:
                 if not PollReactor.exist():
                     # Choose suitable driver here.
-                    PollReactor._instance = PollReactor(driver=pick())
+                    PollReactor._instance = \
+                        PollReactor(driver=driver or pick())
         return PollReactor._instance
 
+    @property
+    def edge_triggered(self):
+        """True if driver reports events only on readiness change"""
+        return self._driver.edge_triggered
+
+    @property
+    def oneshot(self):
+        """True if driver disables fd after each reported event"""
+        return self._driver.oneshot
+
     def attach_handler(self, fd, event_mask, handler):
         """Attach event handler to given fd.
         @param fd: file descriptor to be observed.
@@ -91,8 +156,13 @@ class PollReactor(object):
         @param handler: handler to be executed when given event happens.
 
         """
-        self._handlers[fd] = handler
+        handlers = self._handlers
+        size = len(handlers)
+        if fd >= size:
+            # Grow table geometrically so attaching is amortized O(1).
+            handlers.extend([None] * max(fd + 1 - size, size))
         self._driver.register(fd, event_mask)
+        handlers[fd] = HandlerRecord(fd, event_mask, handler)
 
     def update_handler(self, fd, event_mask):
         """Update event handler to given fd.
@@ -101,6 +171,15 @@ class PollReactor(object):
 
         """
         self._driver.modify(fd, event_mask)
+        record = self.handler_record(fd)
+        if record is not None:
+            record.event_mask = event_mask
+
+    def handler_record(self, fd):
+        """Returns `HandlerRecord` attached to given fd or `None`"""
+        if 0 <= fd < len(self._handlers):
+            return self._handlers[fd]
+        return None
 
     def remove_handler(self, fd):
         """Remove event handler to given fd.
@@ -108,86 +187,328 @@ class PollReactor(object):
         @param event_mask: event to be observed.
 
         """
+        if self.handler_record(fd) is None:
+            # Already removed, e.g. after its handler raised.
+            return
         self._driver.unregister(fd)
-        self._handlers.pop(fd, None)
+        self._handlers[fd] = None
 
     def attach_callback(self, callback):
-        """Attach callback to `reactor`.
+        """Attach callback to `reactor`. This method is thread-safe.
         Callback would be run in the next loop.
         If main thread is pending in `poll`, our heartbeat
         will force it to bypass `poll` immediately.
 
         """
         self._callbacks.append(callback)
-        if hasattr(self, '_heartbeat'):
+        if self._thread_ident != get_ident() and \
+                hasattr(self, '_heartbeat'):
+            # Reactor thread never blocks in poll with pending callbacks,
+            # so only other threads need to wake it up.
             self._heartbeat.begin()
 
+    @property
+    def executor(self):
+        """Thread pool running jobs submitted by `run_in_executor`"""
+        if self._executor is None:
+            self._executor = ThreadPool(self)
+        return self._executor
+
+    def set_executor(self, executor):
+        """Replace default thread pool. `executor` should have `submit`
+        method returning `Future` completed in reactor thread.
+
+        """
+        self._executor = executor
+
+    def run_in_executor(self, func, *args, **kwargs):
+        """Run blocking `func` in thread pool and returns `Future`.
+        `Future` is completed in reactor thread, so done callbacks can
+        safely touch streams.
+
+        """
+        return self.executor.submit(func, *args, **kwargs)
+
+    @property
+    def process_pool(self):
+        """Process pool running jobs submitted by `run_in_process`"""
+        if self._process_pool is None:
+            self._process_pool = ProcessPool(self)
+        return self._process_pool
+
+    def set_process_pool(self, pool):
+        """Replace default process pool. `pool` should have `submit`
+        method returning `Future` completed in reactor thread.
+
+        """
+        self._process_pool = pool
+
+    def run_in_process(self, func, *args, **kwargs):
+        """Run CPU-bound `func` in process pool and returns `Future`.
+        `func` and args should be picklable. Pass large payload as
+        `bytearray` or `pickle.PickleBuffer` to avoid extra copy.
+
+        """
+        return self.process_pool.submit(func, *args, **kwargs)
+
+    def spawn(self, coro):
+        """Drive coroutine in reactor and returns `Task` of it.
+        Coroutine can await any `Future` of wind, like those returned from
+        `sleep`, `run_in_executor` or stream operations.
+
+        """
+        return Task(coro)
+
+    def sleep(self, delay):
+        """Returns `Future` completed after `delay` seconds"""
+        future = Future()
+        self.call_later(delay, future.set_result, None)
+        return future
+
+    def time(self):
+        """Returns current time of reactor clock.
+        Deadline passed to `call_at` should be based on this clock.
+
+        """
+        return monotonic()
+
+    def call_later(self, delay, callback, *args):
+        """Run `callback` with `args` after `delay` seconds.
+        Returns `Timer` which can be cancelled.
+
+        """
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def call_at(self, deadline, callback, *args):
+        """Run `callback` with `args` when reactor clock reaches `deadline`.
+        Returns `Timer` which can be cancelled.
+        NOTE that this method is not thread-safe. Use `attach_callback`
+        to schedule timer from another thread.
+
+        """
+        if not hasattr(callback, '__call__'):
+            raise ReactorError('Timer callback is not callable')
+        timer = Timer(self, deadline, callback, args)
+        heapq.heappush(
+            self._timers, (deadline, next(self._timer_sequence), timer))
+        return timer
+
+    def cancel_timer(self, timer):
+        """Cancel `timer` lazily.
+        Cancelled timer is not removed from heap here. It is dropped when it
+        reaches top of heap or when heap is compacted.
+
+        """
+        if timer.cancelled:
+            return
+        timer.cancelled = True
+        timer.callback = timer.args = None
+        self._cancelled_timers += 1
+        if self._cancelled_timers > self._TIMER_COMPACT_THRESHOLD and \
+                self._cancelled_timers * 2 > len(self._timers):
+            self._compact_timers()
+
+    def _compact_timers(self):
+        """Rebuild timer heap without cancelled timers.
+        Heap is rebuilt in place, because `_run_timers` may be holding it
+        when a timer callback cancels other timers.
+
+        """
+        self._timers[:] = [
+            entry for entry in self._timers if not entry[2].cancelled]
+        heapq.heapify(self._timers)
+        self._cancelled_timers = 0
+
+    def _run_timers(self):
+        """Run expired timers and returns seconds until nearest deadline.
+        Returns `None` if there is no timer left.
+
+        """
+        timers = self._timers
+        now = self.time()
+        while timers:
+            deadline, _, timer = timers[0]
+            if timer.cancelled:
+                heapq.heappop(timers)
+                self._cancelled_timers -= 1
+                continue
+            if deadline > now:
+                return deadline - now
+            heapq.heappop(timers)
+            callback, args = timer.callback, timer.args
+            # Expired timer can't be cancelled any more.
+            timer.cancelled = True
+            timer.callback = timer.args = None
+            self._safe_run(callback, *args)
+        return None
+
     def _run_callback(self):
-        for callback in self._callbacks:
-            try:
-                callback()
-            except Exception:
-                # TODO: Log exception.
-                # We are eatting error!
-                pass
-        self._callbacks = []
+        """Run callbacks attached before this iteration in a batch.
+        Callbacks attached while running them, or callbacks exceeding
+        `callback_budget` are left for next loop.
+
+        """
+        popleft = self._callbacks.popleft
+        for _ in range(min(len(self._callbacks), self.callback_budget)):
+            self._safe_run(popleft())
+
+    def _safe_run(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            # We are eatting error to keep reactor alive.
+            wind_logger.log(
+                traceback.format_exc(), log_level=LogLevel.ERROR)
+
+    def _poll_timeout(self, poll_timeout):
+        """Run expired timers and decide how long `poll` may block
+        in this iteration.
+
+        """
+        timeout = self._run_timers()
+        if self._callbacks:
+            # If another callback is attached while running callback.
+            return self._NO_TIMEOUT
+        if poll_timeout is None:
+            return timeout
+        if timeout is None:
+            return poll_timeout
+        return min(timeout, poll_timeout)
 
     def run(self, poll_timeout=_DEFAULT_POLL_TIMEOUT):
+        """Run reactor until `stop` is called.
+
+        @param poll_timeout(optional): upper bound of poll blocking time.(sec)
+        By default, poll blocks until io event or nearest timer.
+        """
         self._running = True
-        while True:
-            if not self._running:
-                break
-            timeout = poll_timeout
-            self._run_callback()
-            if self._callbacks:
-                # If another callback is attached while running callback.
-                timeout = self._NO_TIMEOUT
+        self._thread_ident = get_ident()
+        # Bind frequently used attributes to locals for the hot loop.
+        run_callback = self._run_callback
+        decide_timeout = self._poll_timeout
+        dispatch = self._dispatch
+        poll = self._driver.poll
+        while self._running:
+            run_callback()
+            timeout = decide_timeout(poll_timeout)
 
             # Poll returns `List` of (fd, event) tuple
             try:
-                events = self._driver.poll(timeout)
-            except (OSError, select.error) as e:
+                events = poll(timeout)
+            except (OSError, IOError, select.error) as e:
                 if e.args[0] != errno.EINTR:
                     raise
+                continue
+
+            dispatch(events)
+        self._thread_ident = None
 
-            self._events.update(events)
-            while self._events:
-                fd, event_mask = self._events.popitem()
-                handler = self._handlers.get(fd, None)
-                if handler is None:
-                    # XXX: should be handled properly
-                    pass
+    def _dispatch(self, events):
+        """Run handlers for (fd, event) pairs returned by `poll`.
+        Drivers never report same fd twice in one poll, so results are
+        dispatched directly.
+
+        """
+        handlers = self._handlers
+        for fd, event_mask in events:
+            try:
+                record = handlers[fd]
+            except IndexError:
+                continue
+            if record is not None:
+                # Handler may be removed by previous handler.
                 try:
-                    handler(fd, event_mask)
-                except TypeError:
-                    # XXX: should be handled properly
-                    raise
+                    record.handler(fd, event_mask)
+                except Exception:
+                    # Broken fd should not stop serving other fds.
+                    wind_logger.log(
+                        traceback.format_exc(), log_level=LogLevel.ERROR)
+                    if handlers[fd] is record:
+                        self.remove_handler(fd)
 
     def stop(self):
         self._running = False
+        if hasattr(self, '_heartbeat'):
+            # Wake up reactor blocked in poll without timeout.
+            self._heartbeat.begin()
+
+    def close(self):
+        """Shut down pools and `asyncio` bridge created for this reactor.
+        Their threads and processes exit after pending jobs are done.
+        They are created again if reactor is used after it.
+
+        """
+        for pool in (self._executor, self._process_pool, self._io_pool):
+            if hasattr(pool, 'shutdown'):
+                pool.shutdown()
+        if self._asyncio_bridge is not None:
+            self._asyncio_bridge.stop()
+        self._executor = self._process_pool = self._io_pool = None
+        self._asyncio_bridge = None
 
 Reactor = PollReactor
 
 
+class HandlerRecord(object):
+    """Handler attached to fd, stored in fd-indexed table of reactor."""
+    __slots__ = ('fd', 'event_mask', 'handler')
+
+    def __init__(self, fd, event_mask, handler):
+        self.fd = fd
+        self.event_mask = event_mask
+        self.handler = handler
+
+    def __repr__(self):
+        return '<HandlerRecord [%d]>' % self.fd
+
+
+class Timer(object):
+    """Handle of callback scheduled in reactor.
+    Returned from `call_later` and `call_at`.
+
+    """
+    __slots__ = ('_reactor', 'deadline', 'callback', 'args', 'cancelled')
+
+    def __init__(self, reactor, deadline, callback, args):
+        self._reactor = reactor
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """Cancel this timer. Do nothing if already expired or cancelled"""
+        self._reactor.cancel_timer(self)
+
+    def __repr__(self):
+        return '<Timer [%s%s]>' % \
+            (self.deadline, ' cancelled' if self.cancelled else '')
+
+
 class Heartbeat(object):
     """Heartbeat for reactor.
     if another thread tries to attach callback while `reactor`
     is hanging inside the poll, we should bypass poll and rush
     into a next loop because callback may be executed in the next loop.
-    We will force it by sending one byte request.
+    We will force it by writing to `eventfd`, or to `pipe` if `eventfd`
+    is not available.
+    Wakeups are coalesced. While one heartbeat is pending, `begin` doesn't
+    write anything. `end` clears pending flag only after fd is drained.
 
     Methods for the caller.
 
     - __init__()
+    - fileno()
     - begin()
     - end()
     - die()
 
     """
     def __init__(self):
-        self._sock = None
         self._reader = None
         self._writer = None
+        self._eventfd = False
+        self._pending = False
         self._setup()
 
     @property
@@ -202,55 +523,65 @@ class Heartbeat(object):
     def read_handler(self):
         return lambda fd, event_mask: self.end()
 
+    def fileno(self):
+        """Returns fd which should be observed by reactor"""
+        return self._reader
+
     def _setup(self):
-        """Setup instant server for one byte communication.
-        We don't care about a port number of instant server because
-        it's not for accepting connection. OS will pick it up for us.
+        """Setup `eventfd` counter. It needs only one fd and is available
+        on Linux with Python 3.10 and newer. Otherwise, fallback to `pipe`.
 
         """
-        try:
-            self._sock = socket.socket()
-            self._sock.bind(('localhost', 0))
-            self._sock.listen(1)
-            self._writer = socket.socket()
-            self._writer.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            self._writer.connect(self._sock.getsockname())
-            self._reader = self._sock.accept()[0]
-            self._writer.setblocking(0)
-            self._reader.setblocking(0)
-            # Close instant socket because we don't need it anymore.
-        except Exception:
-            pass
+        if hasattr(os, 'eventfd'):
+            fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            self._reader = self._writer = fd
+            self._eventfd = True
+            return
+
+        self._reader, self._writer = os.pipe()
+        for fd in (self._reader, self._writer):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+            flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+            fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
 
     def begin(self):
         """Start new heartbeat, which will force reactor to run"""
+        if self._pending:
+            return
+        self._pending = True
         try:
-            self._writer.send(b'q')
-        except socket.error as e:
-            if e.args[0] in EWOULDBLOCK:
-                pass
+            if self._eventfd:
+                os.eventfd_write(self._writer, 1)
             else:
-                raise e
+                os.write(self._writer, b'q')
+        except (OSError, IOError) as e:
+            # Full pipe means that reactor will wake up anyway.
+            if e.args[0] not in EWOULDBLOCK:
+                raise
 
     def end(self):
         """This method is attached to reactor to finish one hearbeat cycle
-        by receiving one byte from heartbeat writer.
+        by draining heartbeat fd.
+        Pending flag is cleared after draining, so a heartbeat started while
+        draining never leaves the flag set without a wakeup to consume.
+        Callbacks attached in that window are run by this iteration anyway,
+        because reactor runs callbacks after heartbeat handler.
 
         """
         try:
             while True:
-                blood = self._reader.recv(1)
-                if not blood:
+                blood = os.read(self._reader, 4096)
+                if not blood or self._eventfd:
                     # end of read
                     break
-        except socket.error as e:
-            if e.args[0] in EWOULDBLOCK:
-                pass
-            else:
-                raise e
+        except (OSError, IOError) as e:
+            if e.args[0] not in EWOULDBLOCK:
+                raise
+        self._pending = False
 
     def die(self):
-        """Close all sockets"""
-        self._sock.close()
-        self._writer.close()
-        self._reader.close()
+        """Close all fds"""
+        os.close(self._reader)
+        if self._writer != self._reader:
+            os.close(self._writer)
@@ -8,10 +8,15 @@
 """
 
 
+import os
+import stat
+import errno
 import socket
+import collections
 from wind.reactor import Reactor
 from wind.driver import PollEvents
 from wind.concurrency import start_workers
+from wind.log import wind_logger, LogLevel
 from wind.exceptions import ServerError, SocketError, EWOULDBLOCK
 
 
@@ -36,6 +41,11 @@ class BaseServer(object):
     - _event_handler(conn, address)
 
     """
+    # Max number of connections accepted from one listening socket in one
+    # reactor iteration. Leftover connections are accepted in next loop,
+    # so flood of connections can't monopolize reactor.
+    accept_budget = 64
+
     def __init__(self, reactor=None):
         """Initialize BaseServer.
 
@@ -64,7 +74,7 @@ class BaseServer(object):
             raise SocketError('`attach_sockets` can only accept `list`')
         self._bind_to_reactor(sockets=sockets)
 
-    def run(self, address, port, num_workers=None):
+    def run(self, address, port=9000, num_workers=None):
         """This method can start tcp server with multi-process features.
         By default, if `num_workers` is None, N(number of cpu cores) processes
         will be spawned from this method.
@@ -82,9 +92,14 @@ class BaseServer(object):
         if Reactor.exist():
             raise ServerError('`Reactor` is already started on main process.')
 
-        self.bind(address, port)
-
-        start_workers(num_workers=num_workers)
+        if self._bind_per_worker(address):
+            # Each worker binds its own socket, and kernel balances
+            # connections between them.
+            start_workers(num_workers=num_workers)
+            self.bind(address, port)
+        else:
+            self.bind(address, port)
+            start_workers(num_workers=num_workers)
 
         self.reactor = Reactor.instance()
         self._bind_to_reactor()
@@ -96,6 +111,14 @@ class BaseServer(object):
         self.listen(address, port)
         self.reactor.run()
 
+    def _bind_per_worker(self, address):
+        """Returns True if each worker process should bind `address`"""
+        return False
+
+    def _configure_connection(self, conn):
+        """Prepare accepted connection before it is served"""
+        conn.setblocking(0)
+
     def _create_socket(self, family, socket_type):
         try:
             socket_ = socket.socket(family, socket_type)
@@ -121,18 +144,34 @@ class BaseServer(object):
 
     def _attach_accept_handler(self, socket_, callback):
         """Attach `_accept_handler` to socket"""
+        # Peer of unix domain socket has no address, so connections are
+        # identified by path of listening socket instead.
+        unix_address = None
+        if socket_.family == getattr(socket, 'AF_UNIX', None):
+            unix_address = (socket_.getsockname(), None)
+
         def _accept_handler(fd, event_mask):
             """Handle socket accept and execute callback"""
-            while True:
+            reactor = self.reactor
+            for _ in range(self.accept_budget):
                 try:
                     conn, address = socket_.accept()
-                    conn.setblocking(0)
+                    self._configure_connection(conn)
                 except socket.error as e:
                     if e.args[0] in EWOULDBLOCK:
-                        return
+                        break
                     raise
 
-                callback(conn, address)
+                callback(conn, unix_address or address)
+            else:
+                # Budget is exhausted. Edge-triggered driver won't report
+                # pending connections again, so reschedule by ourselves.
+                if reactor.edge_triggered:
+                    reactor.attach_callback(
+                        lambda: _accept_handler(fd, event_mask))
+
+            if reactor.oneshot:
+                reactor.update_handler(fd, PollEvents.READ)
 
         if hasattr(self.reactor, 'attach_handler'):
             self.reactor.attach_handler(
@@ -150,12 +189,105 @@ class BaseServer(object):
         raise NotImplementedError
 
 
+class SocketProfile(object):
+    """Socket options of `TCPServer`.
+    Options of listening socket are applied when it is bound, and options
+    of connection are applied to each accepted socket.
+    Options not supported by platform are ignored.
+
+        profile = SocketProfile(backlog=1024, reuse_port=True,
+                                defer_accept=5, fast_open=256)
+        HTTPServer(app=app, socket_profile=profile).run('0.0.0.0', 80)
+
+    Methods for the caller:
+
+    - __init__(backlog=128, reuse_port=False, defer_accept=None,
+               fast_open=None, no_delay=True, send_buffer=None,
+               receive_buffer=None)
+    - apply_listening(socket_)
+    - apply_connection(socket_)
+
+    """
+    def __init__(self, backlog=128, reuse_port=False, defer_accept=None,
+                 fast_open=None, no_delay=True, send_buffer=None,
+                 receive_buffer=None):
+        """Initialize socket profile.
+
+        @param backlog(optional): length of queue of pending connections.
+        @param reuse_port(optional): if True, set `SO_REUSEPORT` and bind
+        socket in each worker process started by `run`.
+        @param defer_accept(optional): seconds to wait for data before
+        connection is accepted. (`TCP_DEFER_ACCEPT`)
+        @param fast_open(optional): queue length of `TCP_FASTOPEN`.
+        @param no_delay(optional): disable Nagle algorithm on connection.
+        @param send_buffer(optional): `SO_SNDBUF` size.
+        @param receive_buffer(optional): `SO_RCVBUF` size.
+        """
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self.defer_accept = defer_accept
+        self.fast_open = fast_open
+        self.no_delay = no_delay
+        self.send_buffer = send_buffer
+        self.receive_buffer = receive_buffer
+
+    def apply_listening(self, socket_):
+        """Set options of listening socket before it is bound"""
+        tcp = _is_tcp(socket_)
+        if self.reuse_port:
+            _setsockopt(socket_, socket.SOL_SOCKET, 'SO_REUSEPORT', 1)
+        if self.defer_accept and tcp:
+            _setsockopt(socket_, socket.IPPROTO_TCP, 'TCP_DEFER_ACCEPT',
+                        self.defer_accept)
+        if self.fast_open and tcp:
+            _setsockopt(socket_, socket.IPPROTO_TCP, 'TCP_FASTOPEN',
+                        self.fast_open)
+        # Accepted sockets inherit buffer sizes of listening socket.
+        if self.send_buffer:
+            _setsockopt(socket_, socket.SOL_SOCKET, 'SO_SNDBUF',
+                        self.send_buffer)
+        if self.receive_buffer:
+            _setsockopt(socket_, socket.SOL_SOCKET, 'SO_RCVBUF',
+                        self.receive_buffer)
+
+    def apply_connection(self, socket_):
+        """Set options of accepted socket"""
+        if not _is_tcp(socket_):
+            return
+        if self.no_delay:
+            _setsockopt(socket_, socket.IPPROTO_TCP, 'TCP_NODELAY', 1)
+
+
+def _log_socket_error(action, error):
+    wind_logger.log(
+        'UDP server failed to %s: %s' % (action, error),
+        log_level=LogLevel.WARN)
+
+
+def _is_tcp(socket_):
+    return socket_.type == socket.SOCK_STREAM and \
+        socket_.family in (socket.AF_INET, socket.AF_INET6)
+
+
+def _setsockopt(socket_, level, name, value):
+    """Set option by its name if platform has it"""
+    option = getattr(socket, name, None)
+    if option is not None:
+        socket_.setsockopt(level, option, value)
+
+
 class TCPServer(BaseServer):
     """Non-blocking, single-threaded TCP Server implementation.
+    It also listens on unix domain socket if address starts with `unix:`.
+    Port is ignored for unix domain socket.
+
+        server.run_simple('unix:/var/run/wind.sock')
+        # Abstract namespace (Linux only)
+        server.run_simple('unix:@wind')
 
     Methods for the caller:
 
-    - __init__(reactor=None)
+    - __init__(reactor=None, socket_profile=None)
     - bind(address, port)
     - listen(address, port)
     - attach_sockets(sockets)
@@ -167,14 +299,24 @@ class TCPServer(BaseServer):
 
     """
 
-    # It will consume kernel resource
+    # It will consume kernel resource.
+    # Used if `socket_profile` is not given.
     backlog_size = 128
 
-    def __init__(self, reactor=None):
+    # Prefix of address of unix domain socket.
+    UNIX_PREFIX = 'unix:'
+
+    # Permission bits of unix domain socket file. umask applies if None.
+    unix_socket_mode = None
+
+    def __init__(self, reactor=None, socket_profile=None):
         """Initialize tcp server.
 
+        @param socket_profile(optional): `SocketProfile` of server.
         """
         super(TCPServer, self).__init__(reactor=reactor)
+        self.socket_profile = socket_profile or \
+            SocketProfile(backlog=self.backlog_size)
 
     def bind(self, address, port):
         """Binds socket on specified address, port"""
@@ -187,19 +329,72 @@ class TCPServer(BaseServer):
         Sockets should be bound all ip address if `address` is
         a hostname.
         """
+        if address.startswith(self.UNIX_PREFIX):
+            return self._bind_unix_socket(address[len(self.UNIX_PREFIX):])
         socket_ = self._create_socket()
+        self.socket_profile.apply_listening(socket_)
         socket_.bind((address, port))
-        socket_.listen(self.backlog_size)
+        socket_.listen(self.socket_profile.backlog)
+        return socket_
+
+    def _bind_unix_socket(self, path):
+        """Creates listening unix domain socket bound to `path`.
+        Path starting with `@` is name in abstract namespace, which has
+        no file.
+
+        """
+        abstract = path.startswith('@')
+        if abstract:
+            path = '\0' + path[1:]
+        else:
+            self._remove_stale_socket(path)
+
+        socket_ = self._create_socket(socket.AF_UNIX)
+        self.socket_profile.apply_listening(socket_)
+        socket_.bind(path)
+        if self.unix_socket_mode is not None and not abstract:
+            os.chmod(path, self.unix_socket_mode)
+        socket_.listen(self.socket_profile.backlog)
         return socket_
 
-    def _create_socket(self):
+    def _remove_stale_socket(self, path):
+        """Remove socket file left by server which is not running"""
+        try:
+            mode = os.stat(path).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ServerError('%s exists and is not a socket' % path)
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except socket.error as e:
+            if e.args[0] not in (errno.ECONNREFUSED, errno.ENOENT):
+                raise
+            os.remove(path)
+        else:
+            raise ServerError('Server is already listening on %s' % path)
+        finally:
+            probe.close()
+
+    def _create_socket(self, family=socket.AF_INET):
         """Create new stream non-blocking socket and returns it."""
         socket_ = super(TCPServer, self). \
-            _create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            _create_socket(family, socket.SOCK_STREAM)
+        if family != getattr(socket, 'AF_UNIX', None):
+            socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         socket_.setblocking(0)
         return socket_
 
+    def _bind_per_worker(self, address):
+        return self.socket_profile.reuse_port and \
+            not address.startswith(self.UNIX_PREFIX)
+
+    def _configure_connection(self, conn):
+        super(TCPServer, self)._configure_connection(conn)
+        self.socket_profile.apply_connection(conn)
+
     def listen(self, address, port):
         """Binds socket and actually attach this server on reactor"""
         self.bind(address, port)
@@ -210,5 +405,175 @@ class TCPServer(BaseServer):
 
 
 class UDPServer(BaseServer):
-    # TODO : Planned to be implemented later.
-    pass
+    """Non-blocking, single-threaded UDP Server implementation.
+    Datagrams are received in batches into buffers allocated once per
+    socket, and handed to `_batch_handler` at once.
+
+    Methods for the caller:
+
+    - __init__(reactor=None, socket_profile=None)
+    - bind(address, port)
+    - listen(address, port)
+    - send_batch(socket_, datagrams)
+    - run_simple(address, port=9000)
+
+    Methods that should be overrided
+
+    - _batch_handler(socket_, datagrams)
+      or _datagram_handler(socket_, data, address)
+
+    """
+
+    # Max number of datagrams received in one batch.
+    batch_size = 64
+
+    # Max number of batches received in one reactor iteration.
+    batch_budget = 16
+
+    # Datagram larger than this is truncated.
+    max_datagram_size = 65535
+
+    # Max number of datagrams waiting for socket to be writable.
+    # Datagrams beyond it are dropped as kernel would do.
+    max_send_queue = 4096
+
+    def __init__(self, reactor=None, socket_profile=None):
+        """Initialize udp server.
+
+        @param socket_profile(optional): `SocketProfile` of server.
+        Only `reuse_port` and buffer sizes are applied.
+        """
+        super(UDPServer, self).__init__(reactor=reactor)
+        self.socket_profile = socket_profile or SocketProfile()
+        # Dict of fd -> `deque` of (data, address) waiting to be sent.
+        self._send_queues = {}
+
+    def bind(self, address, port):
+        """Binds socket on specified address, port"""
+        socket_ = self._create_socket(socket.AF_INET, socket.SOCK_DGRAM)
+        socket_.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        socket_.setblocking(0)
+        self.socket_profile.apply_listening(socket_)
+        socket_.bind((address, port))
+        self._sockets.append(socket_)
+
+    def listen(self, address, port):
+        """Binds socket and actually attach this server on reactor"""
+        self.bind(address, port)
+        self._bind_to_reactor()
+
+    def _bind_per_worker(self, address):
+        return self.socket_profile.reuse_port
+
+    def _attach_accept_handler(self, socket_, callback):
+        """Attach handler receiving and sending datagrams to socket"""
+        buffer_ = bytearray(self.batch_size * self.max_datagram_size)
+        views = []
+        view = memoryview(buffer_)
+        for i in range(self.batch_size):
+            start = i * self.max_datagram_size
+            views.append(view[start:start + self.max_datagram_size])
+        fd = socket_.fileno()
+        self._send_queues[fd] = collections.deque()
+
+        def _datagram_handler(fd, event_mask):
+            reactor = self.reactor
+            if event_mask & PollEvents.WRITE:
+                self._flush(socket_)
+            if event_mask & PollEvents.READ:
+                for _ in range(self.batch_budget):
+                    datagrams = self._receive_batch(socket_, views)
+                    if datagrams:
+                        self._batch_handler(socket_, datagrams)
+                    if len(datagrams) < self.batch_size:
+                        break
+                else:
+                    # Budget is exhausted. Edge-triggered driver won't
+                    # report pending datagrams again.
+                    if reactor.edge_triggered:
+                        reactor.attach_callback(
+                            lambda: _datagram_handler(fd, PollEvents.READ))
+            if reactor.oneshot:
+                reactor.update_handler(fd, self._event_mask(fd))
+
+        self.reactor.attach_handler(fd, PollEvents.READ, _datagram_handler)
+
+    def _receive_batch(self, socket_, views):
+        """Returns `list` of (data, address) received into `views`.
+        `data` is `memoryview` valid until next batch is received.
+        Errors such as `ECONNREFUSED` reported for earlier datagrams are
+        logged and skipped, so that they don't stop server.
+
+        """
+        datagrams = []
+        for view in views:
+            try:
+                num_bytes, address = socket_.recvfrom_into(view)
+            except socket.error as e:
+                if e.args[0] in EWOULDBLOCK:
+                    break
+                _log_socket_error('receive', e)
+                continue
+            datagrams.append((view[:num_bytes], address))
+        return datagrams
+
+    def _batch_handler(self, socket_, datagrams):
+        """Handle batch of datagrams received from `socket_`.
+        By default, it calls `_datagram_handler` for each of them.
+        `data` of datagram should be copied if it is used after return.
+
+        """
+        for data, address in datagrams:
+            self._datagram_handler(socket_, data, address)
+
+    def _datagram_handler(self, socket_, data, address):
+        raise NotImplementedError
+
+    def send_batch(self, socket_, datagrams):
+        """Send `list` of (data, address) from `socket_`.
+        Datagrams which can't be sent now are queued and sent when
+        socket becomes writable.
+
+        """
+        fd = socket_.fileno()
+        queue = self._send_queues[fd]
+        if not queue:
+            datagrams = datagrams[self._send(socket_, datagrams):]
+        space = max(self.max_send_queue - len(queue), 0)
+        # Received `memoryview` is copied because its buffer is reused.
+        queue.extend(
+            (bytes(data), address) for data, address in datagrams[:space])
+        self._update_event_mask(fd)
+
+    def _send(self, socket_, datagrams):
+        """Send datagrams until socket blocks and returns number sent.
+        Datagram which can't be sent for other reason is logged and dropped.
+
+        """
+        for i, (data, address) in enumerate(datagrams):
+            try:
+                socket_.sendto(data, address)
+            except socket.error as e:
+                if e.args[0] in EWOULDBLOCK:
+                    return i
+                _log_socket_error('send datagram to %s' % (address,), e)
+        return len(datagrams)
+
+    def _flush(self, socket_):
+        fd = socket_.fileno()
+        queue = self._send_queues[fd]
+        for _ in range(self._send(socket_, queue)):
+            queue.popleft()
+        self._update_event_mask(fd)
+
+    def _update_event_mask(self, fd):
+        """Observe `WRITE` only while datagrams are queued"""
+        event_mask = self._event_mask(fd)
+        record = self.reactor.handler_record(fd)
+        if record is not None and record.event_mask != event_mask:
+            self.reactor.update_handler(fd, event_mask)
+
+    def _event_mask(self, fd):
+        if self._send_queues[fd]:
+            return PollEvents.READ | PollEvents.WRITE
+        return PollEvents.READ
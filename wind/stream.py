@@ -7,57 +7,76 @@
 
 """
 
+import os
+import ssl
 import socket
+import threading
+from functools import partial
+from itertools import chain, islice
+from collections import deque, OrderedDict
 from wind.reactor import Reactor
+from wind.concurrency import Future, ThreadPool
 from wind.driver import PollEvents
 from wind.compat import basestring
-from wind.datastructures import FlexibleDeque
+from wind.datastructures import ChunkBuffer, BufferPool
 from wind.exceptions import StreamError, EWOULDBLOCK, ECONNRESET
 
 
-class StreamBuffer(FlexibleDeque):
-    """Buffer for stream read and write."""
-
-    def __init__(self, *args, **kwargs):
-        """Initialize `_frozen` to False.
-        `_frozen` is flag used to check whether current buffer
-        is available for reading from or writing to.
-
-        """
-        self._frozen = False
-
-    @property
-    def frozen(self):
-        return self._frozen
-
-    @frozen.setter
-    def frozen(self, value):
-        self._frozen = value
-
-
 class BaseStream(object):
     """Base class for io stream classes.
     Provide methods to read from and write to file or socket.
     This class can handle read, write methods asynchronously
     by attaching callback when calling method.
 
+    Several reads and writes may be pending at once. They are completed in
+    the order they were requested. Each of them takes callback, or returns
+    `Future` if callback is not provided.
+
     Methods for the caller:
 
     - __init__(chunk_size=4096)
     - open()
     - close()
-    - read_bytes(num_bytes)
-    - read_until(delimiter)
-    - write(chunk)
+    - set_close_callback(callback)
+    - read_bytes(num_bytes, callback=None, view=False)
+    - read_until(delimiter, callback=None, include=False, max_bytes=None)
+    - write(chunk, callback=None)
+    - writelines(chunks, callback=None)
+    - drain(callback=None)
+    - writable
+    - pause_reading()
+    - resume_reading()
 
     Methods should be overrided
 
-    - _read_from_fd()
-    - _write_to_fd(chunk)
+    - _read_from_fd(size)
+    - _write_to_fd(buffers)
 
 
     """
 
+    # Max bytes read from fd in one reactor iteration. Leftover bytes are
+    # read in next loop, so fast sender can't monopolize reactor.
+    read_budget = 256 * 1024
+
+    # Size of one read adapts to observed throughput. It's doubled when
+    # read fills whole chunk, and halved when read uses only a quarter.
+    max_read_chunk_size = 256 * 1024
+
+    # Pool of receive buffers shared by all streams.
+    buffer_pool = BufferPool()
+
+    # Stream stops reading from fd when read buffer reaches high watermark,
+    # and starts again when buffer is drained below low watermark.
+    # Buffer may exceed high watermark to complete read waiting for more.
+    read_high_watermark = 1024 * 1024
+    read_low_watermark = 256 * 1024
+
+    # Stream is not `writable` when write buffer reaches high watermark.
+    # `drain` completes when buffer is drained to low watermark.
+    write_high_watermark = 1024 * 1024
+    write_low_watermark = 256 * 1024
+
     def __init__(self, reactor=None, chunk_size=4096):
         """Initialize and open base stream.
 
@@ -65,24 +84,34 @@ class BaseStream(object):
 
         """
         self._reactor = reactor or Reactor.instance()
-        self._read_buffer = StreamBuffer()
-        self._write_buffer = StreamBuffer()
+        self._read_buffer = ChunkBuffer(pool=self.buffer_pool)
+        # `deque` of `memoryview` of chunks not written yet.
+        self._write_buffer = deque()
+        self._write_buffer_bytes = 0
         self._read_chunk_size = chunk_size
-        self._write_chunk_size = 128 * 1024
-        self._read_buffer_bytes = 0
+        self._min_read_chunk_size = chunk_size
+        # True if reading is paused by `pause_reading`.
+        self._reading_paused = False
+        # True if read buffer has reached high watermark.
+        self._read_throttled = False
         self._is_opened = False
 
-        # Stream should save this flags because read, write should be started
-        # with last states when read, write was excuted by event handler.
-        self._bytes_to_read = None
-        self._delimiter = None
-        self._include_delimiter = None
+        # Stream should save pending reads because they should be completed
+        # when read is excuted by event handler. (`deque` of `ReadRequest`)
+        self._read_requests = deque()
+        # Pending write callbacks. (`deque` of `WriteRequest`)
+        # Callback runs when total written bytes reach its offset.
+        self._write_requests = deque()
+        # Pending `drain` callbacks. (`deque` of `WriteRequest`)
+        self._drain_requests = deque()
+        self._bytes_queued = 0
+        self._bytes_written = 0
 
         # Saves asynchronous event handled by `reactor`. (PollEvents)
         self._handler_event = None
+        # True if one-shot driver has disabled fd after reporting event.
+        self._handler_disarmed = False
 
-        self._read_callback = None
-        self._write_callback = None
         self._close_callback = None
 
         self.open()
@@ -97,13 +126,27 @@ class BaseStream(object):
             self._close_fd()
             self._run_close_callback()
 
+    def set_close_callback(self, callback):
+        """Run `callback` once when this stream is closed"""
+        self._close_callback = callback
+
     def _clear(self):
         """Make this stream to initial state after served one request"""
         if self._handler_event is not None:
             self._handler_event = None
             self._reactor.remove_handler(self.fileno())
-        self._read_callback = self._write_callback = None
-        self._read_buffer_bytes = 0
+        # Nobody would complete pending futures any more. Fail them in next
+        # loop, so that code awaiting them doesn't run inside `close`.
+        error = StreamError('Stream is closed')
+        for request in chain(self._read_requests, self._write_requests,
+                             self._drain_requests):
+            if request.future is not None:
+                self._reactor.attach_callback(
+                    partial(request.future.set_exception, error))
+        self._read_requests.clear()
+        self._write_requests.clear()
+        self._drain_requests.clear()
+        self._read_buffer.clear()
         self._read_buffer = self._write_buffer = None
 
     def _close_fd(self):
@@ -113,125 +156,246 @@ class BaseStream(object):
         """Returns fd of socket or file"""
         raise NotImplementedError
 
+    @property
+    def reactor(self):
+        return self._reactor
+
     @property
     def closed(self):
         return not self._is_opened
 
     @property
     def reading(self):
-        return self._read_callback is not None
+        return bool(self._read_requests)
 
     @property
     def writing(self):
-        return self._write_callback is not None
+        return bool(self._write_requests)
+
+    @property
+    def writable(self):
+        """False if write buffer has reached high watermark.
+        Producer should wait for `drain` before writing more.
+
+        """
+        return not self.closed and \
+            self._write_buffer_bytes < self.write_high_watermark
 
-    def read_bytes(self, bytes_to_read, callback):
-        """Read `bytes_to_read` bytes from file"""
+    @property
+    def reading_paused(self):
+        return self._reading_paused
+
+    def pause_reading(self):
+        """Stop reading from fd until `resume_reading` is called.
+        Pending reads are still completed with bytes already buffered.
+
+        """
+        self._reading_paused = True
+        self._detach_read_handler()
+
+    def resume_reading(self):
+        """Start reading from fd again after `pause_reading`"""
+        if self._reading_paused:
+            self._reading_paused = False
+            self._reactor.attach_callback(self._restart_read)
+
+    def read_bytes(self, bytes_to_read, callback=None, view=False):
+        """Read `bytes_to_read` bytes from file.
+        If `callback` is not provided, returns `Future` of chunk.
+
+        @param view(optional): if True, chunk may be `memoryview` of
+        receive buffer instead of `bytes`, so it is not copied when
+        it was received at once.
+        """
         if not isinstance(bytes_to_read, int):
             raise StreamError('`read_bytes` can only accept `int` param')
-        self._bytes_to_read = bytes_to_read
 
-        self._add_callback(callback)
+        future, callback = self._prepare_callback(callback)
+        self._read_requests.append(
+            ReadRequest(bytes_to_read, None, False, view, callback, future))
         self._process_read()
+        return future
 
-    def read_until(self, delimiter, callback, include=False):
+    def read_until(self, delimiter, callback=None, include=False,
+                   max_bytes=None):
         """Read until first occurrence of `delimiter`.
         Returned chunk that contains `delimiter`
+        If `callback` is not provided, returns `Future` of chunk.
 
         @param include(optional): if True, include `delimiter` in chunk.
-
+        @param max_bytes(optional): if `delimiter` is not found within
+        `max_bytes` bytes, read fails and stream is closed.
         """
         if not isinstance(delimiter, basestring):
             raise StreamError('`read_until` can only accept `str` param')
-        self._delimiter = delimiter
-        self._include_delimiter = include
 
-        self._add_callback(callback)
+        future, callback = self._prepare_callback(callback)
+        self._read_requests.append(ReadRequest(
+            max_bytes, delimiter, include, False, callback, future))
         self._process_read()
+        return future
 
     def _process_read(self):
         """fd -> read buffer -> memory"""
-        while not self.closed:
-            if self._to_read_buffer() == 0:
+        if self.closed:
+            return
+        budget = self.read_budget
+        # New read may wait for more bytes than throttled buffer has.
+        self._update_read_throttle()
+        while not self.closed and not self._read_blocked():
+            num_bytes = self._to_read_buffer(
+                min(self._read_chunk_size, budget))
+            if not num_bytes:
                 # End of read
                 break
+            self._update_read_throttle()
+            budget -= num_bytes
+            if budget <= 0:
+                break
         if self.closed:
             return
 
-        if not self._read_buffer:
-            self._attach_read_handler()
+        if budget <= 0 and self._reactor.edge_triggered and \
+                not self._read_blocked():
+            # Budget is exhausted before `EWOULDBLOCK`. Edge-triggered driver
+            # won't report leftover bytes, so read them in next loop.
+            self._reactor.attach_callback(self._resume_read)
+
+        result = self._read()
+        if self.closed:
             return
 
-        if self._read() == -1:
+        if self._read_throttled:
+            self._update_read_throttle()
+            if not self._read_blocked():
+                # Buffer is drained. Bytes left in fd may not be reported
+                # again by edge-triggered driver, so read them explicitly.
+                self._reactor.attach_callback(self._restart_read)
+
+        if self._read_blocked():
+            self._detach_read_handler()
+        elif result == -1:
             self._attach_read_handler()
-            return
 
-    def _to_read_buffer(self):
+    def _read_blocked(self):
+        return self._reading_paused or self._read_throttled
+
+    def _update_read_throttle(self):
+        """Throttle reading by high and low watermarks of read buffer"""
+        size = len(self._read_buffer)
+        if self._read_throttled:
+            if size <= self.read_low_watermark or self._read_wants_more():
+                self._read_throttled = False
+        elif size >= self.read_high_watermark and \
+                not self._read_wants_more():
+            self._read_throttled = True
+
+    def _read_wants_more(self):
+        """Returns True if first pending read can't be completed with
+        bytes in read buffer.
+
+        """
+        if not self._read_requests:
+            return False
+        request = self._read_requests[0]
+        size = len(self._read_buffer)
+        if request.delimiter is None:
+            return size < request.num_bytes
+        if request.num_bytes is not None and size >= request.num_bytes:
+            # Read is rejected by `max_bytes` anyway.
+            return False
+        return self._read_buffer.find(request.delimiter) == -1
+
+    def _resume_read(self):
+        """Continue reading if someone still waits for it"""
+        if not self.closed and self.reading:
+            self._handle_read()
+
+    def _restart_read(self):
+        """Read from fd again after reading was paused or throttled"""
+        if not self.closed and not self._read_blocked():
+            self._handle_read()
+
+    def _to_read_buffer(self, size):
         """Read chunk from socket or file and returns number of bytes read.
 
+        @param size: max bytes to read.
         """
         try:
-            chunk = self._read_from_fd()
+            chunk = self._read_from_fd(size)
             if not chunk or chunk is None:
                 return 0
         except socket.error:
             self.close()
             return
 
-        # No buffer size limit yet.
+        num_bytes = len(chunk)
+        self._adapt_read_chunk_size(num_bytes, size)
         self._read_buffer.append(chunk)
-        self._read_buffer_bytes += len(chunk)
-        return len(chunk)
+        return num_bytes
+
+    def _adapt_read_chunk_size(self, num_bytes, size):
+        """Grow or shrink read chunk by `num_bytes` read with `size`"""
+        current = self._read_chunk_size
+        if num_bytes >= size:
+            self._read_chunk_size = min(
+                current * 2, self.max_read_chunk_size)
+        elif num_bytes <= current // 4:
+            self._read_chunk_size = max(
+                current // 2, self._min_read_chunk_size)
 
     def _read(self):
-        """Read chunk from `_read_buffer` and run callback with that chunk.
-        Returns `-1` if read params are invalid, or read is not completed.
+        """Complete pending reads in order with chunks in `_read_buffer`.
+        Returns `-1` if some read is not completed.
         (if there is more data to be read)
 
         """
         self._raise_if_closed()
 
-        # XXX: handle all expectable cases
-        read_bytes = 0
-        if self._bytes_to_read is not None:
-            if self._read_buffer_bytes < self._bytes_to_read:
-                return -1
-
-            read_bytes = min(self._bytes_to_read, self._read_buffer_bytes)
-            self._run_callback(
-                self._pop_callback(), self._pop_chunk(read_bytes))
-        elif self._delimiter is not None:
-            while True:
-                if not self._read_buffer:
-                    break
-
-                pos = self._read_buffer[0].find(self._delimiter)
-                if pos != -1:
-                    # Found delimiter
-                    if self._include_delimiter:
-                        pos += len(self._delimiter)
-                    self._delimiter = None
-                    self._run_callback(
-                        self._pop_callback(), self._pop_chunk(pos))
-                    break
-
-                if len(self._read_buffer) == 1:
-                    # No delimiter found in whole read buffer.
-                    break
+        requests = self._read_requests
+        buffer_ = self._read_buffer
+        while requests:
+            request = requests[0]
+            if request.delimiter is None:
+                if len(buffer_) < request.num_bytes:
+                    return -1
+                chunk = buffer_.consume(request.num_bytes)
+                if not request.view and isinstance(chunk, memoryview):
+                    chunk = chunk.tobytes()
+            else:
+                max_bytes = request.num_bytes
+                pos = buffer_.find(request.delimiter)
+                if pos == -1:
+                    if max_bytes is not None and len(buffer_) >= max_bytes:
+                        self._reject_read(request)
+                        return
+                    return -1
+                end = pos + len(request.delimiter)
+                if max_bytes is not None and end > max_bytes:
+                    self._reject_read(request)
+                    return
+                chunk = buffer_.consume(end)
+                if not request.include:
+                    chunk = chunk[:pos]
+                if isinstance(chunk, memoryview):
+                    chunk = chunk.tobytes()
+            requests.popleft()
+            self._run_callback(request.callback, chunk)
+            if self.closed:
+                return
 
-                # No delimiter found in first chunk.
-                self._read_buffer.gather(
-                    len(self._read_buffer[0] + self._read_buffer[1]))
-        else:
-            return -1
+    def _reject_read(self, request):
+        """Fail `read_until` which delimiter is not found within max bytes.
+        Stream is closed because rest of data can't be parsed.
 
-    def _pop_chunk(self, read_bytes):
-        """Pop chunk from `_read_buffer` and Returns chunk."""
-        self._read_buffer_bytes -= read_bytes
-        self._read_buffer.gather(read_bytes)
-        return self._read_buffer.popleft()
+        """
+        self._read_requests.popleft()
+        if request.future is not None:
+            request.future.set_exception(StreamError(
+                'Delimiter is not found in %d bytes' % request.num_bytes))
+        self.close()
 
-    def _read_from_fd(self):
+    def _read_from_fd(self, size):
         raise NotImplementedError()
 
     def _attach_read_handler(self):
@@ -242,66 +406,128 @@ class BaseStream(object):
         """
         self._attach_stream_handler(PollEvents.READ)
 
-    def write(self, chunk, callback):
-        if not isinstance(chunk, basestring):
-            raise StreamError('Can write only chunk of `bytes`')
+    def write(self, chunk, callback=None):
+        """Write chunk to fd.
+        If `callback` is not provided, returns `Future` completed when
+        whole chunk is written.
 
-        self._add_callback(callback, read=False)
-        self._process_write(chunk=chunk)
+        """
+        return self.writelines((chunk,), callback)
 
-    def _process_write(self, chunk=None):
-        """Write chunk to socket.
-        This method doesn't save written chunk on memory for performance.
-        NOTE that if self._write_callback is provided, it will be executed
-        even if exception ECONNRESET happens.
+    def writelines(self, chunks, callback=None):
+        """Write several chunks to fd without joining them.
+        Chunks are not copied, so `bytearray` should not be modified until
+        it is written.
+        If `callback` is not provided, returns `Future` completed when
+        all chunks are written.
 
         """
         self._raise_if_closed()
-        partial = chunk is None
-        if not partial:
+        for chunk in chunks:
+            if not isinstance(chunk, (bytes, bytearray, memoryview)):
+                raise StreamError('Can write only chunk of `bytes`')
+
+        future, callback = self._prepare_callback(callback)
+        for chunk in chunks:
             self._to_write_buffer(chunk)
+        if callback is not None:
+            self._write_requests.append(
+                WriteRequest(self._bytes_queued, callback, future))
+        self._process_write()
+        return future
+
+    def drain(self, callback=None):
+        """Wait until write buffer is drained to low watermark.
+        If `callback` is not provided, returns `Future` of it.
+
+        """
+        self._raise_if_closed()
+        future, callback = self._prepare_callback(callback)
+        self._drain_requests.append(WriteRequest(None, callback, future))
+        self._run_drain_callbacks()
+        return future
+
+    def _process_write(self):
+        """Write chunks in `_write_buffer` to socket.
+        This method doesn't save written chunk on memory for performance.
+        NOTE that pending write callbacks will be executed even if exception
+        ECONNRESET happens.
+
+        """
+        self._raise_if_closed()
 
-        while self._write_buffer:
+        buffer_ = self._write_buffer
+        while buffer_:
             try:
-                num_bytes = self._write_to_fd(self._write_buffer[0])
-                if num_bytes == 0:
-                    self._write_buffer.frozen = True
+                num_bytes = self._write_to_fd(buffer_)
+                if not num_bytes:
                     break
-                self._write_buffer.frozen = False
-
-                # Partial writing is handled here.
-                self._write_buffer.gather(num_bytes)
-                self._write_buffer.popleft()
+                self._consume_write_buffer(num_bytes)
             except socket.error as e:
-                if e.args[0] in EWOULDBLOCK:
-                    # Freeze
-                    self._write_buffer.frozen = True
-                elif e.args[0] in ECONNRESET:
-                    # Callback runs here.
-                    self._run_callback(self._pop_callback(read=False))
+                if e.args[0] in ECONNRESET:
+                    # Callbacks run here.
+                    self._bytes_written = self._bytes_queued
+                    self._run_write_callbacks()
                     self.close()
-                else:
+                elif e.args[0] not in EWOULDBLOCK:
                     raise StreamError(e)
                 break
 
+        if self.closed:
+            return
+
         # Post write process.
-        if self._write_buffer and not partial:
+        if self._write_buffer:
             # Writing is not completed at one go
             self._attach_write_handler()
-        elif not self._write_buffer:
-            self._run_callback(self._pop_callback(read=False))
-
-    def _to_write_buffer(self, chunk):
-        """Fill `_write_buffer` after dividing `chunk` with
-        `_write_chunk_size` bytes blocks.
-
-        """
+        else:
+            self._detach_write_handler()
+        self._run_write_callbacks()
+        if not self.closed:
+            self._run_drain_callbacks()
+
+    def _consume_write_buffer(self, num_bytes):
+        """Remove `num_bytes` written bytes from `_write_buffer`"""
+        self._bytes_written += num_bytes
+        self._write_buffer_bytes -= num_bytes
+        buffer_ = self._write_buffer
+        # Partial writing is handled here by slicing view.
+        while num_bytes:
+            view = buffer_[0]
+            if len(view) > num_bytes:
+                buffer_[0] = view[num_bytes:]
+                break
+            num_bytes -= len(view)
+            buffer_.popleft()
+
+    def _run_drain_callbacks(self):
+        requests = self._drain_requests
+        while requests and \
+                self._write_buffer_bytes <= self.write_low_watermark:
+            self._run_callback(requests.popleft().callback)
+            if self.closed:
+                return
 
-        if chunk:
-            for i in range(0, len(chunk), self._write_chunk_size):
-                self._write_buffer.append(chunk[i:i + self._write_chunk_size])
+    def _run_write_callbacks(self):
+        """Run callbacks of writes whose chunks are completely written"""
+        requests = self._write_requests
+        while requests and requests[0].offset <= self._bytes_written:
+            self._run_callback(requests.popleft().callback)
+            if self.closed:
+                return
 
-    def _write_to_fd(self, chunk):
+    def _to_write_buffer(self, chunk):
+        """Append `memoryview` of `chunk` to `_write_buffer`"""
+        view = memoryview(chunk)
+        if view.itemsize != 1:
+            view = view.cast('B')
+        if view:
+            self._write_buffer.append(view)
+            self._write_buffer_bytes += len(view)
+            self._bytes_queued += len(view)
+
+    def _write_to_fd(self, buffers):
+        """Write from `deque` of `memoryview` and returns bytes written"""
         raise NotImplementedError()
 
     def _attach_write_handler(self):
@@ -312,46 +538,51 @@ class BaseStream(object):
         """
         self._attach_stream_handler(PollEvents.WRITE)
 
+    def _detach_write_handler(self):
+        """Stop observing `WRITE` after write buffer is drained.
+        Level-triggered driver would report writable socket in every loop.
+        Edge-triggered driver keeps `WRITE` because it is reported only when
+        socket becomes writable again.
+
+        """
+        self._detach_stream_handler(PollEvents.WRITE)
+
+    def _detach_read_handler(self):
+        """Stop observing `READ` while reading is paused or throttled"""
+        self._detach_stream_handler(PollEvents.READ)
+
+    def _detach_stream_handler(self, event):
+        if self._handler_event is None or self._reactor.edge_triggered or \
+                self._reactor.oneshot:
+            # One-shot stream is re-armed only with pending events.
+            return
+        if self._handler_event & event:
+            self._handler_event &= ~event
+            if self._handler_event:
+                self._reactor.update_handler(
+                    self.fileno(), self._handler_event)
+            else:
+                self._handler_event = None
+                self._reactor.remove_handler(self.fileno())
+
     def _raise_if_closed(self):
         if self.closed:
             raise StreamError('Cannot read because stream is already closed')
 
-    def _pop_callback(self, read=True):
-        """Returns saved callback and clear read or write callback
-
-        @param read (optional): True if read callback else write callback.
-        """
-        if read:
-            callback = self._read_callback
-            self._read_callback = None
-        else:
-            callback = self._write_callback
-            self._write_callback = None
-        return callback
+    def _prepare_callback(self, callback):
+        """Returns (`Future`, callback completing it) if `callback` is None.
+        Otherwise, check whether `callback` is callable and returns
+        (None, `callback`).
+        Callback is checked only once here, then run directly when read or
+        write is completed.
 
-    def _add_callback(self, callback, read=True):
-        """Check whether passed callback has acceptable form.
-        We imported `inspect` here because it's not on the mainstream.
-
-        @param callback: Callback method to be saved.
-        @param read (optional): True if read callback else write callback.
         """
-        from inspect import getargspec
         if callback is None:
-            return
-
+            future = Future()
+            return future, future.set_result
         if not hasattr(callback, '__call__'):
             raise StreamError('Stream callback is not callable')
-
-        spec = getargspec(callback)
-        if not spec.args:
-            raise StreamError(
-                'Should provide room for chunk in stream callback')
-
-        if read:
-            self._read_callback = callback
-        else:
-            self._write_callback = callback
+        return None, callback
 
     def _run_callback(self, callback, *args):
         """Immediately run saved callback"""
@@ -373,6 +604,10 @@ class BaseStream(object):
 
     def event_handler(self, fd, events):
         """Handler which will attached to `reactor`"""
+        if self._reactor.oneshot:
+            # Driver has disabled fd. It is re-armed only if this stream
+            # still waits for read or write after handling events.
+            self._handler_disarmed = True
         try:
             if events & PollEvents.READ:
                 self._handle_read()
@@ -387,6 +622,11 @@ class BaseStream(object):
             if self.closed:
                 return
 
+            if self._handler_disarmed:
+                event_mask = self._pending_events()
+                if event_mask:
+                    self._attach_stream_handler(event_mask)
+
         except Exception as e:
             raise StreamError(e)
 
@@ -416,21 +656,86 @@ class BaseStream(object):
 
     def _attach_stream_handler(self, event_mask):
         """Attach handler to `reactor` for the purpose of handling
-        asynchronous reading and writing
+        asynchronous reading and writing.
+        Edge-triggered stream is registered once with both `READ` and
+        `WRITE` and never modified. One-shot stream is re-armed with events
+        it still waits for.
 
         """
         if self.closed:
             return
 
+        if self._reactor.oneshot:
+            event_mask |= self._pending_events()
+        elif self._reactor.edge_triggered:
+            event_mask = PollEvents.READ | PollEvents.WRITE
+
         if self._handler_event is None:
             # Attach new handler
             self._handler_event = event_mask
+            self._handler_disarmed = False
             self._reactor.attach_handler(
                 self.fileno(), self._handler_event, self.event_handler)
-        elif not self._handler_event & event_mask:
+        elif not self._handler_event & event_mask or \
+                self._handler_disarmed:
             # Update event of existing handler
-            self._handler_event |= event_mask
-            self._reactor.update_handler(self.fileno(), event_mask)
+            if self._handler_disarmed:
+                self._handler_event = event_mask
+            else:
+                self._handler_event |= event_mask
+            self._handler_disarmed = False
+            self._reactor.update_handler(self.fileno(), self._handler_event)
+
+    def _pending_events(self):
+        """Returns events this stream is still waiting for"""
+        event_mask = 0
+        if self.reading and not self._read_blocked():
+            event_mask |= PollEvents.READ
+        if self._write_buffer:
+            event_mask |= PollEvents.WRITE
+        return event_mask
+
+
+class ReadRequest(object):
+    """Pending `read_bytes` or `read_until` of stream.
+    `num_bytes` of `read_until` is max bytes to search for `delimiter`.
+
+    """
+    __slots__ = (
+        'num_bytes', 'delimiter', 'include', 'view', 'callback', 'future')
+
+    def __init__(self, num_bytes, delimiter, include, view, callback,
+                 future):
+        self.num_bytes = num_bytes
+        self.delimiter = delimiter
+        self.include = include
+        self.view = view
+        self.callback = callback
+        self.future = future
+
+
+class WriteRequest(object):
+    """Pending callback of `write` or `drain`.
+    `offset` is total number of bytes queued to stream when it was written,
+    or `None` for `drain`.
+
+    """
+    __slots__ = ('offset', 'callback', 'future')
+
+    def __init__(self, offset, callback, future):
+        self.offset = offset
+        self.callback = callback
+        self.future = future
+
+
+# `sendmsg` is available on unix with Python 3.3 or later.
+_sendmsg = hasattr(socket.socket, 'sendmsg')
+
+# Max number of buffers passed to one `sendmsg`.
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 16
 
 
 class SocketStream(BaseStream):
@@ -444,47 +749,403 @@ class SocketStream(BaseStream):
     def fileno(self):
         return self.socket.fileno()
 
-    def _read_from_fd(self):
+    def _read_from_fd(self, size):
+        """Receive into pooled buffer and returns `memoryview` of
+        received bytes. Buffer goes back to pool when it is consumed.
+
+        """
+        pool = self.buffer_pool
+        receive_buffer = pool.acquire(size)
         try:
-            chunk = self.socket.recv(self._read_chunk_size)
-            if not chunk:
-                # Should close stream here because nothing is left to be read.
-                self.close()
-                return None
-            return chunk
+            num_bytes = self.socket.recv_into(receive_buffer, size)
         except socket.error as e:
+            pool.release(receive_buffer)
             if e.args[0] not in EWOULDBLOCK:
                 raise
             return None
+        if not num_bytes:
+            pool.release(receive_buffer)
+            # Should close stream here because nothing is left to be read.
+            self.close()
+            return None
+        if num_bytes < len(receive_buffer) // 8:
+            # Copy small read, so that slow client trickling bytes doesn't
+            # hold mostly empty buffer for each of them.
+            chunk = bytes(memoryview(receive_buffer)[:num_bytes])
+            pool.release(receive_buffer)
+            return chunk
+        return memoryview(receive_buffer)[:num_bytes]
 
-    def _write_to_fd(self, chunk):
-        return self.socket.send(chunk)
+    def _write_to_fd(self, buffers):
+        if _sendmsg and len(buffers) > 1:
+            # Send several buffers in one call without joining them.
+            return self.socket.sendmsg(list(islice(buffers, _IOV_MAX)))
+        return self.socket.send(buffers[0])
 
     def _close_fd(self):
         self.socket.close()
         self.socket = None
 
 
+class SSLSocketStream(SocketStream):
+    """Socket stream encrypted by TLS.
+    Handshake is done without blocking through reactor, and reads and
+    writes made before it is finished wait for it.
+
+    Server resumes sessions by session ticket or session cache of its
+    `SSLContext`, so one context should be shared by all connections.
+    (see `create_ssl_context`) Client stream saves sessions to
+    `SSLSessionCache` and reuses them when it connects to same server.
+
+    Methods for the caller:
+
+    - __init__(socket_, ssl_context, server_side=True, server_hostname=None,
+               session_cache=None, reactor=None, chunk_size=4096)
+    - handshake_done
+    - alpn_protocol
+    - session_reused
+
+    """
+    def __init__(self, socket_, ssl_context, server_side=True,
+                 server_hostname=None, session_cache=None, *args, **kwargs):
+        """Initialize stream and start handshake.
+
+        @param socket_: connected non-blocking socket.
+        @param ssl_context: `ssl.SSLContext` shared by streams.
+        @param server_side(optional): False for client stream.
+        @param server_hostname(optional): hostname client verifies.
+        @param session_cache(optional): `SSLSessionCache` of client.
+        By default, cache shared by all client streams is used.
+        """
+        self._handshake_done = False
+        self._session_key = None
+        self._session_cache = None
+        session = None
+        if not server_side:
+            self._session_cache = _session_cache if session_cache is None \
+                else session_cache
+            self._session_key = (server_hostname, socket_.getpeername())
+            session = self._session_cache.get(self._session_key)
+
+        if not isinstance(socket_, ssl.SSLSocket):
+            socket_ = ssl_context.wrap_socket(
+                socket_, server_side=server_side,
+                server_hostname=server_hostname,
+                do_handshake_on_connect=False, session=session)
+        super(SSLSocketStream, self).__init__(socket_, *args, **kwargs)
+        self._do_handshake()
+
+    @property
+    def handshake_done(self):
+        return self._handshake_done
+
+    @property
+    def alpn_protocol(self):
+        """Protocol selected by ALPN or None"""
+        if not self._handshake_done:
+            return None
+        return self.socket.selected_alpn_protocol()
+
+    @property
+    def session_reused(self):
+        return self._handshake_done and self.socket.session_reused
+
+    def _do_handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLWantReadError:
+            self._attach_stream_handler(PollEvents.READ)
+            return
+        except ssl.SSLWantWriteError:
+            self._attach_stream_handler(PollEvents.WRITE)
+            return
+        except (ssl.SSLError, socket.error):
+            self.close()
+            return
+
+        self._handshake_done = True
+        self._save_session()
+        # Run reads and writes waiting for handshake.
+        if self._write_buffer:
+            self._handle_write()
+        else:
+            self._detach_write_handler()
+        if not self.closed and self.reading:
+            self._handle_read()
+
+    def _save_session(self):
+        if self._session_cache is not None and \
+                self.socket.session is not None:
+            self._session_cache.set(self._session_key, self.socket.session)
+
+    def _handle_read(self):
+        if self._handshake_done:
+            super(SSLSocketStream, self)._handle_read()
+        else:
+            self._do_handshake()
+
+    def _handle_write(self):
+        if self._handshake_done:
+            super(SSLSocketStream, self)._handle_write()
+        else:
+            self._do_handshake()
+
+    def _process_read(self):
+        if not self._handshake_done:
+            return
+        super(SSLSocketStream, self)._process_read()
+        if not self.closed and self.reading and \
+                not self._read_blocked() and self.socket.pending():
+            # Bytes decrypted in SSL object are not reported by driver.
+            self._reactor.attach_callback(self._resume_read)
+
+    def _process_write(self):
+        self._raise_if_closed()
+        if self._handshake_done:
+            super(SSLSocketStream, self)._process_write()
+
+    def _read_from_fd(self, size):
+        try:
+            return super(SSLSocketStream, self)._read_from_fd(size)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return None
+
+    def _write_to_fd(self, buffers):
+        # SSL socket can't send several buffers at once.
+        try:
+            return self.socket.send(buffers[0])
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return 0
+
+    def _close_fd(self):
+        # TLS 1.3 session ticket arrives after handshake.
+        if self._handshake_done:
+            self._save_session()
+        super(SSLSocketStream, self)._close_fd()
+
+
+class SSLSessionCache(object):
+    """Least recently used TLS sessions of client streams.
+
+    Methods for the caller:
+
+    - __init__(max_size=1024)
+    - get(key)
+    - set(key, session)
+
+    """
+    def __init__(self, max_size=1024):
+        self._max_size = max_size
+        self._sessions = OrderedDict()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, key):
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            self._sessions[key] = session
+        return session
+
+    def set(self, key, session):
+        self._sessions.pop(key, None)
+        self._sessions[key] = session
+        while len(self._sessions) > self._max_size:
+            self._sessions.popitem(last=False)
+
+
+# Session cache shared by client streams.
+_session_cache = SSLSessionCache()
+
+
+def create_ssl_context(certfile=None, keyfile=None, alpn_protocols=None,
+                       server_side=True):
+    """Returns `ssl.SSLContext` for `SSLSocketStream`.
+    Context of server keeps session cache and issues session tickets,
+    so it should be shared by all connections.
+
+    @param certfile(optional): path of certificate chain.
+    @param keyfile(optional): path of private key.
+    @param alpn_protocols(optional): `list` of protocols for ALPN.
+    @param server_side(optional): False for context of client.
+    """
+    purpose = ssl.Purpose.CLIENT_AUTH if server_side else \
+        ssl.Purpose.SERVER_AUTH
+    context = ssl.create_default_context(purpose)
+    if certfile is not None:
+        context.load_cert_chain(certfile, keyfile)
+    if alpn_protocols:
+        context.set_alpn_protocols(alpn_protocols)
+    return context
+
+
 class FileStream(BaseStream):
-    def __init__(self, file_, *args, **kwargs):
-        if not isinstance(file_, file):
+    """Stream of regular file.
+    Poll driver can't wait for regular file because it is always ready,
+    so reads and writes run in io thread pool with `pread` and `pwrite`
+    at offsets of stream, and complete in reactor thread.
+
+    Reads are done up to `read_ahead` bytes ahead of pending reads.
+    Writes made while previous write is running, or in same reactor
+    iteration, are written behind at once.
+    Fd is closed after running io is finished, but pending writes fail
+    on `close` as socket stream. Wait for write before closing stream.
+
+    Methods for the caller:
+
+    - __init__(file_, reactor=None, chunk_size=4096, executor=None)
+
+    """
+
+    # Bytes read in advance of pending reads.
+    read_ahead = 256 * 1024
+
+    # Number of threads of io thread pool shared by streams of reactor.
+    io_workers = 4
+
+    def __init__(self, file_, reactor=None, chunk_size=4096,
+                 executor=None):
+        """Initialize file stream.
+
+        @param file_: file object or fd opened in blocking mode.
+        @param executor(optional): thread pool running io.
+        By default, thread pool shared by file streams of reactor is used.
+        """
+        if isinstance(file_, int):
+            fd = file_
+        elif hasattr(file_, 'fileno'):
+            fd = file_.fileno()
+        else:
             raise StreamError(
-                'FileStream can only be initialized with `file`')
+                'FileStream can only be initialized with file or fd')
         self.file_ = file_
-        super(FileStream, self).__init__(*args, **kwargs)
+        self._fd = fd
+        self._read_offset = self._write_offset = os.lseek(fd, 0, os.SEEK_CUR)
+        self._read_running = False
+        self._write_running = False
+        self._flush_scheduled = False
+        self._eof = False
+        super(FileStream, self).__init__(reactor, chunk_size)
+        self._executor = executor or _io_pool(self._reactor)
 
     def fileno(self):
-        return self.file_.fileno()
+        return self._fd
 
-    def _read_from_fd(self):
-        return self.file_.read(self._read_chunk_size)
+    def _process_read(self):
+        """Complete pending reads and read ahead in io thread"""
+        if self.closed:
+            return
+        result = self._read()
+        if self.closed:
+            return
+        if result == -1 and self._eof:
+            # Pending read can't be completed any more.
+            self.close()
+            return
+        if self._read_running or self._eof or self._reading_paused:
+            return
 
-    def _write_to_fd(self, chunk):
-        try:
-            self.file_.write(chunk)
-        except IOError as e:
-            raise StreamError(e)
+        size = self.read_ahead - len(self._read_buffer)
+        if result == -1:
+            size = max(size, self.read_ahead)
+        if size > 0:
+            self._read_running = True
+            future = self._executor.submit(
+                _pread, self._fd, size, self._read_offset)
+            future.add_done_callback(self._on_read)
+
+    def _on_read(self, future):
+        self._read_running = False
+        if self.closed:
+            self._close_file()
+            return
+        if future.exception() is not None:
+            self.close()
+            return
+        chunk = future.result()
+        if chunk:
+            self._read_offset += len(chunk)
+            self._read_buffer.append(chunk)
+        else:
+            self._eof = True
+        self._handle_read()
+
+    def _process_write(self):
+        """Write buffered chunks in io thread in next reactor iteration"""
+        self._raise_if_closed()
+        if self._write_running or self._flush_scheduled or \
+                not self._write_buffer:
+            return
+        self._flush_scheduled = True
+        self._reactor.attach_callback(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        if self.closed or self._write_running or not self._write_buffer:
+            return
+        self._write_running = True
+        future = self._executor.submit(
+            _pwritev, self._fd, list(self._write_buffer), self._write_offset)
+        future.add_done_callback(self._on_write)
+
+    def _on_write(self, future):
+        self._write_running = False
+        if self.closed:
+            self._close_file()
+            return
+        if future.exception() is not None:
+            self.close()
+            return
+        num_bytes = future.result()
+        self._write_offset += num_bytes
+        self._consume_write_buffer(num_bytes)
+        self._run_write_callbacks()
+        if not self.closed:
+            self._run_drain_callbacks()
+        if not self.closed:
+            self._process_write()
 
     def _close_fd(self):
-        self.file_.close()
+        # Worker thread may still use fd. It is closed when io is done.
+        self._close_file()
+
+    def _close_file(self):
+        if self.file_ is None or self._read_running or self._write_running:
+            return
+        if isinstance(self.file_, int):
+            os.close(self.file_)
+        else:
+            self.file_.close()
         self.file_ = None
+
+
+def _pread(fd, size, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+def _pwritev(fd, buffers, offset):
+    """Write `buffers` to `offset` of `fd` and returns bytes written"""
+    if hasattr(os, 'pwritev'):
+        return os.pwritev(fd, buffers[:_IOV_MAX], offset)
+    chunk = b''.join(buffers)
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, chunk, offset)
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.write(fd, chunk)
+
+
+# Lock for seeking fd where `pread` and `pwrite` are not available.
+_seek_lock = threading.Lock()
+
+
+def _io_pool(reactor):
+    """Returns io thread pool shared by file streams of `reactor`"""
+    if reactor._io_pool is None:
+        reactor._io_pool = ThreadPool(
+            reactor, max_workers=FileStream.io_workers)
+    return reactor._io_pool
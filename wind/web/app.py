@@ -11,19 +11,36 @@ import json
 import types
 import hashlib
 import traceback
+from functools import partial
+from wind.compat import iscoroutine, basestring
+from wind.concurrency import Future
 from wind.web.codec import encode, to_str
 from wind.log import wind_logger, LogType
 from wind.web.httpmodels import (
     HTTPRequest, HTTPResponse, HTTPMethod,
     HTTPStatusCode, HTTPResponseHeader)
 from wind.datastructures import FlexibleDeque
-from wind.exceptions import ApplicationError, HTTPError
+from wind.exceptions import ApplicationError, HTTPError, ConcurrencyError
 
 
-def path(handler, route, methods):
-    """Api method for providing intuition to url binding."""
+def path(handler, route, methods, blocking=False, cpu_bound=False,
+         stream_body=False, max_body_size=None):
+    """Api method for providing intuition to url binding.
+
+    @param blocking(optional): if True, handler runs in thread pool of
+    reactor so that blocking call in it doesn't stall other connections.
+    @param cpu_bound(optional): if True, handler runs in process pool of
+    reactor. Only picklable method handler can be cpu bound.
+    @param stream_body(optional): if True, request body is passed to
+    `Resource.data_received` as it arrives instead of being buffered.
+    @param max_body_size(optional): request body larger than this is
+    rejected. By default, `HTTPHandler.max_body_size` is used.
+    """
     # TODO: Validate parameters
-    return Path(handler, route=route, methods=methods)
+    return Path(
+        handler, route=route, methods=methods,
+        blocking=blocking, cpu_bound=cpu_bound,
+        stream_body=stream_body, max_body_size=max_body_size)
 
 
 class WindApp(object):
@@ -61,6 +78,11 @@ class WindApp(object):
         if not isinstance(request, HTTPRequest):
             raise ApplicationError('Can only react to `HTTPRequest`')
 
+        # Run handling method. Blocking path runs it in thread pool.
+        self.lookup(request).follow(conn, request)
+
+    def lookup(self, request):
+        """Returns `Path` handling `request`"""
         path = self._dispatcher.lookup(request.path)
         if path is None:
             # No registered path. We don't need to handle this request.
@@ -69,9 +91,13 @@ class WindApp(object):
 
             # Let's make a path to error.
             path = Path(self._error_handler)
+        return path
 
-        # Synchronously run handling method. (Temporarily)
-        path.follow(conn, request)
+    def reject(self, conn, request, status_code):
+        """Respond to `request` with error status before it is handled"""
+        def error_handler(request):
+            raise HTTPError(status_code)
+        Path(error_handler).follow(conn, request)
 
     def _error_handler(self, request):
         raise HTTPError(HTTPStatusCode.NOT_FOUND)
@@ -95,7 +121,9 @@ class Path(object):
     """Contains information needed for handling HTTP request."""
 
     def __init__(
-            self, handler, route=None, methods=None, **kwargs):
+            self, handler, route=None, methods=None, blocking=False,
+            cpu_bound=False, stream_body=False, max_body_size=None,
+            **kwargs):
         """Initialize path.
         @param handler:
             Method or Class inherits from `Resource`.
@@ -104,13 +132,32 @@ class Path(object):
             If it's None, this path is considered as `error path`.
         @param methods:
             Allowed HTTP methods. `List` of string indicating method.
+        @param blocking:
+            If True, handler is run in thread pool of reactor.
+        @param cpu_bound:
+            If True, handler is run in process pool of reactor.
+            `Resource` can't be cpu bound because it holds connection.
+        @param stream_body:
+            If True, request body is streamed to `Resource.data_received`.
+            Only `Resource` can stream body.
+        @param max_body_size:
+            Request body larger than this is rejected.
 
         """
-        # if handler is not method binding, delay handler creation time
-        # to time when actually serving request.
+        # Handler creation is delayed to time when actually serving request
+        # because `Resource` keeps state of single request.
+        self._function = None
         if isinstance(handler, (types.FunctionType, types.MethodType)):
-            handler = self._wrap_handler(handler)
+            self._function = handler
+        elif cpu_bound:
+            raise ApplicationError('Only method handler can be cpu bound')
+        if stream_body and self._function is not None:
+            raise ApplicationError('Only `Resource` can stream body')
         self._handler = handler
+        self._blocking = blocking or cpu_bound
+        self._cpu_bound = cpu_bound
+        self._stream_body = stream_body
+        self._max_body_size = max_body_size
         self._error_path = route is None
         if not self._error_path:
             self._route = self._process_route(route)
@@ -129,6 +176,22 @@ class Path(object):
     def error_path(self):
         return self._error_path
 
+    @property
+    def blocking(self):
+        return self._blocking
+
+    @property
+    def cpu_bound(self):
+        return self._cpu_bound
+
+    @property
+    def stream_body(self):
+        return self._stream_body
+
+    @property
+    def max_body_size(self):
+        return self._max_body_size
+
     def allowed(self, method):
         """Assume param `method` has already converted to lowercase"""
         if hasattr(self, '_methods'):
@@ -140,11 +203,14 @@ class Path(object):
         react to HTTP request.
 
         """
-        if isinstance(self._handler, type):
-            # Actual handler creation for user-defined `Resource`.
-            self._handler(path=self).react(conn, request)
-        else:
-            self._handler.react(conn, request)
+        self.resource().react(conn, request)
+
+    def resource(self):
+        """Returns new `Resource` handling request of this path"""
+        if self._function is not None:
+            return self._wrap_handler(self._function)
+        # Actual handler creation for user-defined `Resource`.
+        return self._handler(path=self)
 
     def _validate_method(self, method):
         if method not in HTTPMethod.all():
@@ -174,21 +240,32 @@ class Resource(object):
     """Class for HTTP web resource.
     May inherit this class to implement `comet` or asynchronously
     handle HTTP request.
+    Handlers can be `async def`. Coroutine handler is driven by reactor,
+    may await `Future` of wind, and response is finished when it returns.
+    Handlers may also return generator or iterable of chunks. Its chunks
+    are sent as they are produced, only when client keeps up with them.
+    If path streams body, `data_received` is called with chunks of body
+    before handler is called.
 
     Methods for the caller:
 
     - __init__(path=None)
+    - prepare(conn, request)
+    - receive(chunk, callback)
     - react(conn, request)
     - inject(method=None)
     - add_response_header(key, value)
     - remove_response_header(key)
     - send_response(status_code=HTTPStatusCode.OK)
     - write(chunk, left=False)
+    - flush(callback=None)
     - finish()
+    - reactor
 
     Methods may be overrided:
 
     - initialize()
+    - data_received(chunk)
     - handle_get(request)
     - handle_post(request)
     - handle_put(request)
@@ -197,6 +274,10 @@ class Resource(object):
     - _error_message()
 
     """
+    # Chunks produced by iterable body are flushed once this many bytes
+    # are written.
+    stream_buffer_size = 64 * 1024
+
     def __init__(self, path=None):
         self._path = path
         self._synchronous_handler = None
@@ -209,12 +290,28 @@ class Resource(object):
         self._write_buffer_bytes = 0
         self._response_header = HTTPResponseHeader()
         self._asynchronous = True
+        # True while handler is running in thread pool.
+        self._offloaded = False
+        self._finish_pending = False
+        # True after response is handed to stream.
+        self._finished = False
+        # True after response header is sent by `flush`.
+        self._streaming = False
+        self._chunked = False
+        self._body_iterator = None
+        # True while request body is streamed to `data_received`.
+        self._receiving_body = False
         self.initialize()
 
     def initialize(self):
         """Constructor hook"""
         pass
 
+    @property
+    def reactor(self):
+        """Reactor serving connection of current request"""
+        return self._conn.stream.reactor
+
     def handle_get(self):
         self._raise_not_allowed()
 
@@ -233,12 +330,55 @@ class Resource(object):
     def _raise_not_allowed(self):
         raise HTTPError(HTTPStatusCode.METHOD_NOT_ALLOWED)
 
+    def data_received(self, chunk):
+        """Called with chunk of request body if path streams body.
+        If it returns `Future` or coroutine, next chunk is not read until
+        it is done.
+
+        """
+        pass
+
+    def prepare(self, conn, request):
+        """Start receiving body of `request` streamed by `receive`"""
+        self._conn = conn
+        self._request = request
+        self._receiving_body = True
+
+    def receive(self, chunk, callback):
+        """Pass `chunk` of request body to `data_received`, and run
+        `callback` when this resource is ready for next chunk.
+        `callback` is not run if handling chunk failed or response has
+        been finished.
+
+        """
+        try:
+            result = self.data_received(chunk)
+            if iscoroutine(result):
+                result = self.reactor.spawn(result)
+        except Exception as e:
+            self._handle_exception(e)
+            return
+        if isinstance(result, Future):
+            result.add_done_callback(partial(self._on_received, callback))
+        elif not self._finished:
+            callback()
+
+    def _on_received(self, callback, future):
+        try:
+            future.result()
+        except Exception as e:
+            self._handle_exception(e)
+            return
+        if not self._finished:
+            callback()
+
     def inject(self, method=None):
         if hasattr(method, '__call__') and path is not None:
             self._synchronous_handler = method
 
     def react(self, conn, request):
         self._processing = True
+        self._receiving_body = False
         self._conn = conn
         self._request = request
 
@@ -247,34 +387,130 @@ class Resource(object):
                     and not self._path.error_path:
                 self._raise_not_allowed()
 
-            if self._synchronous_handler is not None:
+            if self._path.blocking:
+                self._react_in_executor()
+            elif self._synchronous_handler is not None:
                 # Simply run synchronous handler for test!
                 # NOTE that there's no etag support to this kind of handler.
                 chunk = self._synchronous_handler(request)
-                self.write(chunk)
-                self.finish()
+                if _awaitable(chunk):
+                    self._react_in_coroutine(chunk)
+                elif _iterable_body(chunk):
+                    self._send_iterable(chunk)
+                else:
+                    self.write(chunk)
+                    self.finish()
             else:
                 # Execute request handler
-                getattr(self, 'handle_' + request.method)()
-                if not self._asynchronous:
+                result = getattr(self, 'handle_' + request.method)()
+                if _awaitable(result):
+                    self._react_in_coroutine(result)
+                elif _iterable_body(result):
+                    self._send_iterable(result)
+                elif not self._asynchronous:
                     self.finish()
-        except HTTPError as e:
-            http_errors = \
-                [
-                    HTTPStatusCode.NOT_FOUND,
-                    HTTPStatusCode.METHOD_NOT_ALLOWED,
-                    HTTPStatusCode.NOT_MODIFIED
-                ]
-            if e.args[0] in http_errors:
-                self.send_response(status_code=e.args[0])
-            else:
-                # XXX: Grab this.
-                pass
         except Exception as e:
+            self._handle_exception(e)
+
+    def _react_in_coroutine(self, coro):
+        """Drive coroutine returned by `async def` handler in reactor, or
+        wait for `Future` returned by handler.
+        Response is finished when coroutine returns, unless handler has
+        already finished it.
+
+        """
+        if iscoroutine(coro):
+            coro = self.reactor.spawn(coro)
+        coro.add_done_callback(self._on_coroutine_done)
+
+    def _on_coroutine_done(self, task):
+        try:
+            chunk = task.result()
+            if self._finished:
+                return
+            if self._synchronous_handler is not None:
+                if _iterable_body(chunk):
+                    self._send_iterable(chunk)
+                    return
+                self.write(chunk)
+            self.finish()
+        except Exception as e:
+            self._handle_exception(e)
+
+    def _handle_exception(self, e):
+        """Send error response for exception raised by handler.
+        Should be called while handling exception to log traceback.
+        If response header has already been flushed, or response has
+        already been finished, connection is closed to tell client that
+        response is broken.
+
+        """
+        if self._finished:
             wind_logger.log(traceback.format_exc(), LogType.ACCESS)
+            self._conn.close()
+            return
+
+        if self._streaming:
+            wind_logger.log(traceback.format_exc(), LogType.ACCESS)
+            self._body_iterator = None
+            self._conn.close()
+            return
+
+        if isinstance(e, HTTPError):
+            # Response is always sent, so that responses pipelined after
+            # it are not held.
+            self.send_response(status_code=e.status_code)
+        else:
+            wind_logger.log(traceback.format_exc(), LogType.ACCESS)
+            # State of connection is unknown after unexpected error.
+            self._request.keep_alive = False
             self.send_response(
                 status_code=HTTPStatusCode.INTERNAL_SERVER_ERROR)
 
+    def _react_in_executor(self):
+        """Run handler in thread pool of reactor, or in process pool if path
+        is cpu bound.
+        Handler may `write` in pool thread, but `finish` is delayed until
+        result is marshalled back to reactor thread.
+
+        """
+        if self._synchronous_handler is not None:
+            func, args = self._synchronous_handler, (self._request,)
+        else:
+            func, args = getattr(self, 'handle_' + self._request.method), ()
+
+        reactor = self.reactor
+        # Set before submitting, since handler may run before it returns.
+        self._offloaded = True
+        try:
+            if self._path.cpu_bound:
+                future = reactor.run_in_process(func, *args)
+            else:
+                future = reactor.run_in_executor(func, *args)
+        except ConcurrencyError:
+            self._offloaded = False
+            raise HTTPError(HTTPStatusCode.SERVICE_UNAVAILABLE)
+        future.add_done_callback(self._on_executor_done)
+
+    def _on_executor_done(self, future):
+        """Runs in reactor thread after handler in thread pool returned"""
+        self._offloaded = False
+        try:
+            chunk = future.result()
+            if _awaitable(chunk):
+                # `async def` handler only created coroutine in thread.
+                self._react_in_coroutine(chunk)
+            elif _iterable_body(chunk):
+                self._send_iterable(chunk)
+            elif self._synchronous_handler is not None:
+                self.write(chunk)
+                self.finish()
+            elif self._finish_pending or not self._asynchronous:
+                self._finish_pending = False
+                self.finish()
+        except Exception as e:
+            self._handle_exception(e)
+
     def write(self, chunk, left=False):
         if isinstance(chunk, dict):
             chunk = json.dumps(chunk)
@@ -302,10 +538,21 @@ class Resource(object):
         self._status_code = status_code
 
     def finish(self):
-        """This method finishes current connection by sending response
+        """This method finishes current request by sending response
         with written chunk in self._write_buffer.
+        If it is called in thread pool, response is sent after handler
+        returns to reactor thread.
+        Connection is kept for next request if it is persistent.
 
         """
+        if self._offloaded:
+            self._finish_pending = True
+            return
+
+        if self._streaming:
+            self._finish_streaming()
+            return
+
         if self._etag_available():
             etag = self._generate_etag()
             request_etag = self._get_etag()
@@ -314,18 +561,12 @@ class Resource(object):
             else:
                 self._set_etag(etag)
 
-        if self._write_buffer:
-            self._response_header. \
-                add_content_length(self._write_buffer_bytes)
-
         self.set_status_code(HTTPStatusCode.OK)
         self._generate_response()
-        self.write(self._response.raw(), left=True)
-        self._write_buffer.gather(self._write_buffer_bytes)
-        self._conn.stream.write(self._write_buffer.popleft(), self._clear)
+        self._send_buffer()
 
     def send_response(self, status_code=HTTPStatusCode.OK):
-        """This method finishes current connection by sending response which
+        """This method finishes current request by sending response which
         is typically error.
         NOTE that it will write only response headers regardless of chunks
         in self._write_buffer.
@@ -333,11 +574,103 @@ class Resource(object):
         """
         self._flush_buffer()
         self.set_status_code(status_code)
-        self.write(self._error_message())
+        if status_code != HTTPStatusCode.NOT_MODIFIED:
+            self.write(self._error_message())
         self._generate_response()
-        self.write(self._response.raw(), left=True)
-        self._write_buffer.gather(self._write_buffer_bytes)
-        self._conn.stream.write(self._write_buffer.popleft(), self._clear)
+        self._send_buffer()
+
+    def flush(self, callback=None):
+        """Send chunks written so far before response is finished.
+        Response header is sent with first flush, and body is sent with
+        chunked transfer encoding. (HTTP/1.0 connection is closed after
+        response instead) `finish` should be called after last chunk.
+
+        @param callback(optional): run when client has taken flushed
+        chunks, so that handler produces next chunks without flooding
+        memory. If it is not provided, returns `Future` of it.
+        """
+        if self._offloaded:
+            raise ApplicationError('`flush` can not be called in thread pool')
+
+        future = None
+        if callback is None:
+            future = Future()
+            callback = partial(future.set_result, None)
+
+        chunks = []
+        if not self._streaming:
+            self._streaming = True
+            self._chunked = self._request.version == 'HTTP/1.1'
+            if self._status_code is None:
+                self.set_status_code(HTTPStatusCode.OK)
+            self._generate_response()
+            chunks.append(self._response.raw())
+        chunks.extend(self._frame_buffer())
+        self._conn.write_response(
+            self._request, chunks, callback, finished=False)
+        return future
+
+    def _frame_buffer(self):
+        """Returns chunks in self._write_buffer framed for transfer, and
+        flush buffer.
+
+        """
+        chunks = list(self._write_buffer)
+        size = self._write_buffer_bytes
+        self._flush_buffer()
+        if self._request.method == HTTPMethod.HEAD:
+            # Response to HEAD has no body.
+            return []
+        if self._chunked and size:
+            chunks.insert(0, encode('%x\r\n' % size))
+            chunks.append(b'\r\n')
+        return chunks
+
+    def _finish_streaming(self):
+        chunks = self._frame_buffer()
+        if self._chunked and self._request.method != HTTPMethod.HEAD:
+            chunks.append(b'0\r\n\r\n')
+        self._finished = True
+        self._conn.write_response(self._request, chunks, self._clear)
+
+    def _send_iterable(self, iterable):
+        """Send chunks produced by `iterable` as response body"""
+        self._body_iterator = iter(iterable)
+        self._send_next_chunks()
+
+    def _send_next_chunks(self):
+        """Write chunks from body iterator up to `stream_buffer_size`, and
+        flush them. Rest of them are produced after client takes these.
+        Small body is finished with `Content-Length` without streaming.
+
+        """
+        if self._body_iterator is None:
+            return
+        try:
+            for chunk in self._body_iterator:
+                self.write(chunk)
+                if self._write_buffer_bytes >= self.stream_buffer_size:
+                    self.flush(self._send_next_chunks)
+                    return
+            self._body_iterator = None
+            self.finish()
+        except Exception as e:
+            self._handle_exception(e)
+
+    def _send_buffer(self):
+        """Send response header and chunks in self._write_buffer.
+        They are passed to stream as they are, so body is never copied
+        to be joined with header. Connection writes them after responses
+        to previous pipelined requests.
+        Body of response to HEAD is not sent, but `Content-Length` is
+        still the length of it.
+
+        """
+        chunks = [self._response.raw()]
+        if self._request.method != HTTPMethod.HEAD:
+            chunks.extend(self._write_buffer)
+        self._finished = True
+        self._conn.write_response(self._request, chunks, self._clear)
 
     def _error_message(self):
         """This method can be overrided to make custom error message
@@ -353,12 +686,37 @@ class Resource(object):
         you should call this method again to generate response.
 
         """
+        # Body should be delimited by length to keep connection alive.
+        if self._streaming:
+            if self._chunked:
+                self.add_response_header('Transfer-Encoding', 'chunked')
+            else:
+                self._request.keep_alive = False
+        elif self._status_code != HTTPStatusCode.NOT_MODIFIED:
+            self._response_header. \
+                add_content_length(self._write_buffer_bytes)
+        self._add_connection_header()
         self._response = HTTPResponse(
             request=self._request, headers=self._response_header.to_dict(),
             status_code=self._status_code)
 
+    def _add_connection_header(self):
+        """Tell client whether connection persists after this response.
+        Handler may close persistent connection by adding
+        `Connection: close` response header.
+
+        """
+        request = self._request
+        connection = self._response_header.get('Connection') or ''
+        # Rest of body is not read if response is sent while receiving it.
+        if connection.lower() == 'close' or self._receiving_body:
+            request.keep_alive = False
+        if not request.keep_alive:
+            self.add_response_header('Connection', 'close')
+        elif request.version == 'HTTP/1.0':
+            self.add_response_header('Connection', 'keep-alive')
+
     def _clear(self):
-        self._conn.close()
         self._log_access()
         self._processing = False
         self._conn = self._request = None
@@ -405,3 +763,17 @@ class Resource(object):
 
         """
         return float(self._request.version[-3:]) > 1.0
+
+
+def _iterable_body(body):
+    """Returns True if handler returned iterable of chunks as body.
+    `Future` is iterable only to be awaited.
+
+    """
+    return hasattr(body, '__iter__') and not isinstance(
+        body, (basestring, bytearray, memoryview, dict, Future))
+
+
+def _awaitable(result):
+    """Returns True if response is finished after `result` completes"""
+    return iscoroutine(result) or isinstance(result, Future)
@@ -26,6 +26,8 @@ def encode(chunk, encoding=_DEFAULT_ENCODING):
 
         if isinstance(chunk, bytes):
             return chunk
+        if isinstance(chunk, (bytearray, memoryview)):
+            return bytes(chunk)
         if isinstance(chunk, unicode):
             return chunk.encode(encoding)
 
@@ -40,7 +42,7 @@ def to_str(bytes_):
         return bytes_
 
     if isinstance(bytes_, (tuple, list)):
-        return type(bytes_)(i.decode(_DEFAULT_ENCODING) for i in bytes_)
+        return type(bytes_)(to_str(i) for i in bytes_)
     if isinstance(bytes_, bytes):
         return bytes_.decode(_DEFAULT_ENCODING)
     raise CodecError('`bytes_to_str` only accepts `tuple`, `list`, `bytes`.')
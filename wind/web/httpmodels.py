@@ -7,12 +7,22 @@
 
 """
 
+import re
+import tempfile
+from functools import partial
+from collections import deque
 from wind import __version__
-from wind.stream import SocketStream
-from wind.exceptions import WindException
-from wind.datastructures import CaseInsensitiveDict
+from wind.concurrency import Future
+from wind.stream import SocketStream, SSLSocketStream, FileStream
+from wind.exceptions import WindException, HTTPError
+from wind.datastructures import CaseInsensitiveDict, ChunkBuffer
 from wind.web.codec import encode, to_str, decode_dict
-from wind.compat import urlparse, parse_qsl, basestring
+from wind.compat import urlparse, parse_qsl, basestring, responses
+
+# Chunk size is strictly hex digits. `int` would also take signs, `0x`
+# prefix, underscores and whitespace, which other parsers may read
+# differently.
+_CHUNK_SIZE = re.compile(br'^[0-9A-Fa-f]+\Z')
 
 
 class HTTPStatusCode():
@@ -24,7 +34,10 @@ class HTTPStatusCode():
     FORBIDDEN = '403'
     NOT_FOUND = '404'
     METHOD_NOT_ALLOWED = '405'
+    REQUEST_ENTITY_TOO_LARGE = '413'
+    REQUEST_HEADER_FIELDS_TOO_LARGE = '431'
     INTERNAL_SERVER_ERROR = '500'
+    SERVICE_UNAVAILABLE = '503'
 
 
 class HTTPMethod():
@@ -65,6 +78,12 @@ class HTTPHeader(object):
     def content_length(self):
         return int(self._headers.get('Content-Length', 0))
 
+    @property
+    def chunked(self):
+        """True if body is sent with chunked transfer encoding"""
+        encoding = self._headers.get('Transfer-Encoding', '')
+        return encoding.lower().endswith('chunked')
+
     def get(self, key):
         return self._headers.get(key)
 
@@ -97,6 +116,10 @@ class HTTPRequestHeader(HTTPHeader):
     def if_none_match(self):
         return self._headers.get('If-None-Match', '')
 
+    @property
+    def expect(self):
+        return self._headers.get('Expect', '')
+
 
 class HTTPResponseHeader(HTTPHeader):
     def __init__(self, dict_=None):
@@ -131,6 +154,10 @@ class HTTPRequest(object):
         self.auth = auth
         self.cookies = cookies
         self.version = version
+        # `UploadedFile` of `multipart/form-data` body by field name.
+        self.files = {}
+        # Whether connection persists after response to this request.
+        self.keep_alive = False
 
     @property
     def path(self):
@@ -184,21 +211,51 @@ class HTTPResponse(object):
             return reply(
                 [version, code.METHOD_NOT_ALLOWED,
                     'Method Not Allowed'])
+        elif status_code == code.REQUEST_ENTITY_TOO_LARGE:
+            return reply(
+                [version, code.REQUEST_ENTITY_TOO_LARGE,
+                    'Request Entity Too Large'])
         elif status_code == code.INTERNAL_SERVER_ERROR:
             return reply(
                 [version, code.INTERNAL_SERVER_ERROR,
                     'Internal Server Error'])
+        elif status_code == code.SERVICE_UNAVAILABLE:
+            return reply(
+                [version, code.SERVICE_UNAVAILABLE, 'Service Unavailable'])
+        else:
+            return reply([version, str(status_code), responses.get(
+                int(status_code), 'Unknown Status')])
 
     def __repr__(self):
         return '<HTTPResponse [%s]>' % (self.status_code)
 
 
 class HTTPConnection(object):
-    """HTTP Connection object containing stream instance"""
+    """HTTP Connection object containing stream instance.
+    Several requests may be served on connection at once. Responses are
+    written in order their requests are expected, and connection is
+    closed after response to request which isn't `keep_alive`.
+
+    Methods for the caller:
+
+    - __init__(stream, address)
+    - open(close_callback=None, finish_callback=None)
+    - expect_response(request)
+    - write_response(request, chunks, callback=None, finished=True)
+    - close()
+    - pending_responses
+
+    """
     def __init__(self, stream, address):
         self._stream = stream
         self._address = address
         self._close_callback = None
+        self._finish_callback = None
+        # Expected responses in request order. (`deque` of `PendingResponse`)
+        self._responses = deque()
+        # Number of expected responses not completely written yet.
+        self._unwritten = 0
+        self._flush_scheduled = False
 
     @property
     def stream(self):
@@ -208,15 +265,101 @@ class HTTPConnection(object):
     def address(self):
         return self._address
 
-    def open(self, close_callback=None):
+    @property
+    def pending_responses(self):
+        return self._unwritten
+
+    def open(self, close_callback=None, finish_callback=None):
+        """Open connection.
+        @param finish_callback(optional): run after responses are written,
+        if connection is kept for next request.
+        """
         self._close_callback = close_callback
+        self._finish_callback = finish_callback
         self._stream.open()
+        # Peer may close connection while it is idle.
+        self._stream.set_close_callback(self._run_close_callback)
+
+    def expect_response(self, request):
+        """Reserve place of response to `request` in response queue"""
+        self._responses.append(PendingResponse(request))
+        self._unwritten += 1
+
+    def write_response(self, request, chunks, callback=None, finished=True):
+        """Write response to `request` after responses to previous requests.
+        Responses ready in same loop are written at once.
+
+        @param finished(optional): False if more of response is written
+        later. Then `callback` is run when stream is drained, so that
+        caller can produce rest of response without flooding memory.
+        Otherwise, it is run when whole response is written.
+        """
+        for response in self._responses:
+            if response.request is request:
+                break
+        else:
+            raise WindException('Response to unexpected request')
+        if response.finished:
+            raise WindException('Response is already finished')
+        response.chunks.extend(chunks)
+        if callback is not None:
+            if finished:
+                response.callback = callback
+            else:
+                response.drain_callbacks.append(callback)
+        response.finished = finished
+        if response is self._responses[0] and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._stream.reactor.attach_callback(self._flush_responses)
+
+    def _flush_responses(self):
+        self._flush_scheduled = False
+        if self._stream.closed:
+            return
+        responses = self._responses
+        chunks, drain_callbacks, written = [], [], []
+        while responses:
+            response = responses[0]
+            chunks.extend(response.chunks)
+            drain_callbacks.extend(response.drain_callbacks)
+            response.chunks = []
+            response.drain_callbacks = []
+            if not response.finished:
+                # Responses behind partially written one should wait.
+                break
+            written.append(responses.popleft())
+            # Uploaded files are not used after response is finished.
+            _close_files(response.request)
+            if not response.request.keep_alive:
+                break
+        self._stream.writelines(
+            chunks, partial(self._on_responses_written, written))
+        for callback in drain_callbacks:
+            if self._stream.closed:
+                return
+            self._stream.drain(callback)
+
+    def _on_responses_written(self, written):
+        if not written:
+            return
+        self._unwritten -= len(written)
+        for response in written:
+            if response.callback is not None:
+                response.callback()
+            if not response.request.keep_alive:
+                self.close()
+                return
+        if self._finish_callback is not None:
+            self._finish_callback()
 
     def close(self):
         self._stream.close()
         self._run_close_callback()
 
     def _run_close_callback(self):
+        # Responses to pending requests won't be written.
+        for response in self._responses:
+            _close_files(response.request)
         if self._close_callback is not None:
             callback = self._close_callback
             self._close_callback = None
@@ -230,11 +373,312 @@ class HTTPConnection(object):
         return '<HTTPConnection [%s]>' % (self.address[0])
 
 
+def _close_files(request):
+    for upload in request.files.values():
+        upload.close()
+
+
+class PendingResponse(object):
+    """Response to request on `HTTPConnection` waiting to be written.
+    `finished` is False until last chunk of response is given.
+
+    """
+    __slots__ = ('request', 'chunks', 'finished', 'callback',
+                 'drain_callbacks')
+
+    def __init__(self, request):
+        self.request = request
+        self.chunks = []
+        self.finished = False
+        self.callback = None
+        self.drain_callbacks = []
+
+
+class UploadedFile(object):
+    """File part of `multipart/form-data` body.
+    `file` is temporary file holding content of part, or None if part is
+    written to sink given by `file_factory` of `MultipartParser`.
+    Temporary file is closed after response to request is finished.
+
+    """
+    def __init__(self, name, filename, content_type, file_=None):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = file_
+        self.size = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def __repr__(self):
+        return '<UploadedFile [%s]>' % (self.filename)
+
+
+class MultipartParser(object):
+    """Incremental parser of `multipart/form-data` body.
+    Body is fed in chunks as it arrives and scanned for boundary once.
+    Fields are kept in memory and set to `fields`, and file parts are
+    written to temporary files as they arrive and set to `files`.
+    So memory usage doesn't depend on size of uploaded files.
+
+    `HTTPHandler` parses multipart body with this parser. `Resource`
+    streaming body may feed it in `data_received` to write file parts to
+    its own sink.
+
+    Methods for the caller:
+
+    - __init__(boundary, file_factory=None, reactor=None)
+    - feed(chunk)
+    - close()
+    - discard()
+    - boundary(content_type)
+
+    """
+
+    # Maximum number of parts in body.
+    max_parts = 1000
+    # Maximum size of header of part.
+    max_part_header_size = 16 * 1024
+    # Maximum size of field value, and of all fields kept in memory.
+    max_field_size = 1024 * 1024
+    max_memory_size = 8 * 1024 * 1024
+    # Maximum size of file part. None means no limit other than body size.
+    max_file_size = None
+
+    def __init__(self, boundary, file_factory=None, reactor=None):
+        """Initialize parser.
+
+        @param boundary: boundary `bytes` of body.
+        @param file_factory(optional): function taking `UploadedFile` and
+        returning sink whose `write(chunk)` is called with content of
+        file part. `write` may return `Future` to make parser wait for it.
+        By default, parts are written to temporary files in io thread pool.
+        @param reactor(optional): reactor running writes of temporary files.
+        """
+        self._delimiter = b'\r\n--' + boundary
+        self._buffer = ChunkBuffer()
+        # First boundary is not preceded by line break.
+        self._buffer.append(b'\r\n')
+        self._parse = self._parse_preamble
+        self._file_factory = file_factory or self._temporary_file
+        self._reactor = reactor
+        self.fields = {}
+        self.files = {}
+        self._num_parts = 0
+        self._memory_size = 0
+        # Name and chunks of current field, or sink of current file.
+        self._name = None
+        self._field = None
+        self._field_size = 0
+        self._upload = None
+        self._sink = None
+        self._writes = []
+        # Streams writing temporary files.
+        self._streams = []
+
+    @staticmethod
+    def boundary(content_type):
+        """Returns boundary `bytes` in `Content-Type` header or None"""
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'boundary' and value:
+                return encode(value.strip('"'))
+
+    def feed(self, chunk):
+        """Parse `chunk` of body. Returns `Future` completed when content of
+        file parts in chunk is written, or None if nothing is written.
+        Raises `HTTPError` if body is malformed or exceeds limits.
+
+        """
+        self._buffer.append(chunk)
+        while self._parse():
+            pass
+        return self._wait_writes()
+
+    def close(self):
+        """Finish parsing after whole body is fed"""
+        if self._parse != self._parse_epilogue:
+            raise HTTPError(HTTPStatusCode.BAD_REQUEST)
+
+    def discard(self):
+        """Close temporary files if body is not handled.
+        Files are closed after writes running in io thread are done.
+
+        """
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+
+    def _parse_preamble(self):
+        return self._skip_to_delimiter(self._parse_boundary_end)
+
+    def _parse_boundary_end(self):
+        """Boundary is followed by line break, or `--` if it's last one"""
+        if len(self._buffer) < 2:
+            return False
+        end = bytes(self._buffer.consume(2))
+        if end == b'--':
+            self._parse = self._parse_epilogue
+        elif end == b'\r\n':
+            self._parse = self._parse_part_header
+        else:
+            raise HTTPError(HTTPStatusCode.BAD_REQUEST)
+        return True
+
+    def _parse_part_header(self):
+        buffer_ = self._buffer
+        pos = buffer_.find(b'\r\n\r\n')
+        if pos == -1:
+            if len(buffer_) > self.max_part_header_size:
+                raise HTTPError(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+            return False
+        raw_headers = bytes(buffer_.consume(pos + 4))
+        try:
+            headers = CaseInsensitiveDict(dict(
+                to_str([field.strip() for field in raw.split(b':', 1)])
+                for raw in raw_headers.split(b'\r\n') if raw))
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPError(HTTPStatusCode.BAD_REQUEST)
+        self._start_part(headers)
+        self._parse = self._parse_part_body
+        return True
+
+    def _parse_part_body(self):
+        return self._skip_to_delimiter(
+            self._parse_boundary_end, self._write_part)
+
+    def _parse_epilogue(self):
+        self._buffer.clear()
+        return False
+
+    def _skip_to_delimiter(self, next_parse, on_data=None):
+        """Consume bytes up to delimiter passing them to `on_data`.
+        If delimiter is not found, bytes which can't be start of it are
+        consumed.
+
+        """
+        buffer_ = self._buffer
+        delimiter = self._delimiter
+        pos = buffer_.find(delimiter)
+        if pos == -1:
+            size = len(buffer_) - len(delimiter) + 1
+            if size > 0:
+                data = buffer_.consume(size)
+                if on_data is not None:
+                    on_data(data)
+            return False
+        if pos:
+            data = buffer_.consume(pos)
+            if on_data is not None:
+                on_data(data)
+        buffer_.consume(len(delimiter))
+        self._end_part()
+        self._parse = next_parse
+        return True
+
+    def _start_part(self, headers):
+        self._num_parts += 1
+        if self._num_parts > self.max_parts:
+            raise HTTPError(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+        params = {}
+        for param in headers.get('Content-Disposition', '').split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            params[key.strip().lower()] = value.strip().strip('"')
+        name = params.get('name')
+        if name is None:
+            raise HTTPError(HTTPStatusCode.BAD_REQUEST)
+        if 'filename' in params:
+            self._upload = UploadedFile(
+                name, params['filename'],
+                headers.get('Content-Type', 'application/octet-stream'))
+            self._sink = self._file_factory(self._upload)
+            self.files[name] = self._upload
+        else:
+            self._name = name
+            self._field = []
+            self._field_size = 0
+
+    def _write_part(self, data):
+        size = len(data)
+        if self._upload is not None:
+            self._upload.size += size
+            if self.max_file_size is not None and \
+                    self._upload.size > self.max_file_size:
+                raise HTTPError(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+            result = self._sink.write(data)
+            if isinstance(result, Future):
+                self._writes.append(result)
+        elif self._field is not None:
+            self._memory_size += size
+            self._field_size += size
+            if self._memory_size > self.max_memory_size or \
+                    self._field_size > self.max_field_size:
+                raise HTTPError(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+            self._field.append(data)
+
+    def _end_part(self):
+        if self._field is not None:
+            try:
+                self.fields[self._name] = to_str(b''.join(self._field))
+            except UnicodeDecodeError:
+                raise HTTPError(HTTPStatusCode.BAD_REQUEST)
+        self._name = self._field = self._upload = self._sink = None
+
+    def _temporary_file(self, upload):
+        upload.file = tempfile.TemporaryFile()
+        stream = FileStream(upload.file, reactor=self._reactor)
+        self._streams.append(stream)
+        return stream
+
+    def _wait_writes(self):
+        """Returns `Future` completed when all pending writes are done"""
+        writes = [future for future in self._writes if not future.done()]
+        self._writes = []
+        if not writes:
+            return None
+        waiter = Future()
+        pending = [len(writes)]
+
+        def on_write(future):
+            pending[0] -= 1
+            if waiter.done():
+                return
+            if future.exception() is not None:
+                waiter.set_exception(future.exception())
+            elif not pending[0]:
+                waiter.set_result()
+
+        for future in writes:
+            future.add_done_callback(on_write)
+        return waiter
+
+
 class HTTPHandler(object):
     """Handles HTTP Requests from client.
     1. Parse header.
     2. Parse body.
     3. Send response if needed.
+    4. Read next request if connection is persistent.
+
+    Pipelined requests are read and dispatched while previous ones are
+    being handled, up to `max_pipeline_depth`. Set it to 1 to handle
+    requests on connection one by one.
+
+    Body is delimited by `Content-Length` or chunked transfer encoding.
+    It is buffered and set to `request.body` unless path streams it to
+    `Resource.data_received`. Body larger than `max_body_size` of path is
+    rejected with 413, before client sends it if it expects
+    `100 Continue`.
+
+    Connection is closed if header of request isn't read within
+    `keep_alive_timeout` while no response is pending, or if part of body
+    doesn't arrive within `body_timeout`.
+
+    `multipart/form-data` body is parsed while it is read by
+    `MultipartParser`. File parts are written to temporary files and set
+    to `request.files`, so they don't stay in memory.
 
     Methods for the caller:
 
@@ -244,27 +688,173 @@ class HTTPHandler(object):
     Inner callbacks:
 
     - _parse_header(chunk)
+    - _parse_chunk_size(line)
+    - _parse_body_data(chunk)
+    - _feed_multipart(chunk)
     - _parse_body(chunk)
     - _parse_params(request)
+    - _finish_request()
 
     """
-    def __init__(self, socket_, address, app=None):
+
+    # Connection is closed if header is not terminated within this size.
+    # Trailer fields of chunked body are limited to this size too.
+    max_header_size = 64 * 1024
+    # Maximum number of requests served on one persistent connection.
+    max_keep_alive_requests = 100
+    # Connection is closed if header of request doesn't arrive within this
+    # many seconds while it's idle.
+    keep_alive_timeout = 15.0
+    # Connection is closed if next part of body doesn't arrive within this
+    # many seconds.
+    body_timeout = 60.0
+    # Maximum number of requests on connection waiting for response.
+    max_pipeline_depth = 16
+    # Default body size limit of path.
+    max_body_size = 100 * 1024 * 1024
+    # Max bytes of body read at once, and passed to `data_received`.
+    body_chunk_size = 64 * 1024
+    # Connection is closed if chunk size line is longer than this.
+    max_chunk_line_size = 4096
+
+    def __init__(self, socket_, address, app=None, ssl_context=None,
+                 reactor=None):
         """Constructor, should not be overriden"""
-        self._conn = HTTPConnection(SocketStream(socket_), address)
+        if ssl_context is None:
+            stream = SocketStream(socket_, reactor=reactor)
+        else:
+            stream = SSLSocketStream(socket_, ssl_context, reactor=reactor)
+        self._conn = HTTPConnection(stream, address)
         self._app = app
+        # Request whose body is being read.
         self._request = None
+        self._requests_read = 0
+        self._idle_timer = None
+        # Reads next part of request. (header, body data or chunk size)
+        self._next_read = self._read_header
+        # True while read is pending in stream, or body is being handled.
+        self._read_pending = False
+        # True while `_read_requests` loop is running.
+        self._reading_requests = False
+        # True after request which closes connection is read.
+        self._closing = False
+        # Body size limit and bytes left in body or current chunk.
+        self._body_limit = None
+        self._body_left = 0
+        self._body_read = 0
+        self._chunked = False
+        # Bytes of trailer fields read after last chunk.
+        self._trailer_size = 0
+        # Buffered body chunks, or `Resource` streaming body.
+        self._body_chunks = []
+        self._body_consumer = None
+        # Parser of `multipart/form-data` body being read.
+        self._multipart = None
 
     def serve_request(self):
-        """Serves single http request with initialized connection"""
-        self._conn.open(close_callback=self._conn_close_callback)
+        """Serves http requests with initialized connection until it is
+        closed.
+
+        """
+        self._conn.open(
+            close_callback=self._conn_close_callback,
+            finish_callback=self._finish_request)
+        self._read_requests()
+
+    def _read_requests(self):
+        """Read and dispatch requests one after another while they are
+        buffered in stream. Part of request read later by callback comes
+        back to this loop, so pipelined requests and body chunks don't
+        nest in call stack.
+
+        """
+        if self._reading_requests:
+            return
+        self._reading_requests = True
+        try:
+            while not self._read_pending and self._can_read_request():
+                self._read_pending = True
+                self._next_read()
+        finally:
+            self._reading_requests = False
+        self._update_idle_timer()
+
+    def _can_read_request(self):
+        if self._conn.stream.closed:
+            return False
+        if self._request is not None:
+            # Body of current request.
+            return True
+        return not self._closing and \
+            self._conn.pending_responses < self.max_pipeline_depth
+
+    def _read_done(self):
+        """Called by read callbacks to continue `_read_requests` loop"""
+        self._read_pending = False
+        self._read_requests()
+
+    def _read_header(self):
         # Start handling http request by reading header.
         self._conn.stream.read_until(
-            b"\r\n\r\n", self._parse_header, include=True)
+            b"\r\n\r\n", self._parse_header, include=True,
+            max_bytes=self.max_header_size)
+
+    def _finish_request(self):
+        """Read more requests after responses are written"""
+        self._read_requests()
+
+    def _update_idle_timer(self):
+        """Close connection if header of request isn't read within
+        `keep_alive_timeout` while no response is pending.
+        Timer is not reset by part of header, so client sending header
+        slowly can't hold connection.
+
+        """
+        if self._idle_timer is None and \
+                self._read_pending and self._request is None and \
+                not self._conn.pending_responses and \
+                not self._conn.stream.closed:
+            self._idle_timer = self._conn.stream.reactor.call_later(
+                self.keep_alive_timeout, self._conn.close)
+
+    def _start_body_timer(self):
+        """Close connection if body data read next doesn't arrive within
+        `body_timeout`.
+
+        """
+        self._cancel_idle_timer()
+        self._idle_timer = self._conn.stream.reactor.call_later(
+            self.body_timeout, self._conn.close)
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._conn.stream.reactor.cancel_timer(self._idle_timer)
+            self._idle_timer = None
 
     def _conn_close_callback(self):
-        pass
+        self._cancel_idle_timer()
+        if self._multipart is not None:
+            self._multipart.discard()
+            self._multipart = None
+
+    def _keep_alive(self, request):
+        """Returns True if connection should persist after `request`.
+        HTTP/1.1 connection is persistent unless client sends
+        `Connection: close`, and HTTP/1.0 one only if client asks for
+        `Connection: keep-alive`.
+
+        """
+        if self._requests_read >= self.max_keep_alive_requests:
+            return False
+        tokens = [
+            token.strip().lower()
+            for token in (request.headers.get('Connection') or '').split(',')]
+        if request.version == 'HTTP/1.1':
+            return 'close' not in tokens
+        return 'keep-alive' in tokens
 
     def _parse_header(self, chunk):
+        self._cancel_idle_timer()
         try:
             if not chunk:
                 # XXX: Grab this exception.
@@ -284,21 +874,235 @@ class HTTPHandler(object):
             # Generate `HTTPRequest`
             # Convert bytes of `url`, `method` to str so that `HTTPRequest`
             # has only request params that is `str` type.
-            self._request = HTTPRequest(
+            request = HTTPRequest(
                 url=to_str(url), method=to_str(method),
                 version=to_str(version), headers=headers)
-            content_length = self._request.headers.content_length
-            if content_length != 0:
-                self._conn.stream.read_bytes(content_length, self._parse_body)
+        except (IndexError, ValueError):
+            # Respond to request which can't be parsed with placeholder,
+            # and close connection after it.
+            self._request = HTTPRequest(
+                url='/', method=HTTPMethod.GET, version='HTTP/1.1',
+                headers=HTTPRequestHeader({}))
+            self._conn.expect_response(self._request)
+            self._reject(HTTPStatusCode.BAD_REQUEST)
+            self._read_done()
+            return
+
+        self._request = request
+        self._requests_read += 1
+        request.keep_alive = self._keep_alive(request)
+        # Requests after the one closing connection are not served.
+        self._closing = not request.keep_alive
+        self._conn.expect_response(request)
+        self._start_body(request)
+        self._read_done()
+
+    def _start_body(self, request):
+        """Decide how to read body of `request`, and dispatch request
+        without body.
+
+        """
+        self._chunked = request.headers.chunked
+        if self._chunked and \
+                request.headers.get('Content-Length') is not None:
+            # Framing is ambiguous, so request can't be read safely.
+            self._reject(HTTPStatusCode.BAD_REQUEST)
+            return
+        try:
+            content_length = \
+                0 if self._chunked else request.headers.content_length
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self._reject(HTTPStatusCode.BAD_REQUEST)
+            return
+        if not self._chunked and not content_length:
+            if request.method == HTTPMethod.GET:
+                request.params = self._parse_params(request)
+            self._handle_request()
+            return
+
+        path = None
+        if self._app is not None:
+            path = self._app.lookup(request)
+        self._body_limit = self.max_body_size
+        if path is not None and path.max_body_size is not None:
+            self._body_limit = path.max_body_size
+        if content_length > self._body_limit:
+            self._reject(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+            return
+
+        if request.headers.expect.lower() == '100-continue' and \
+                request.version == 'HTTP/1.1':
+            # Client waits for this before sending body.
+            self._conn.write_response(
+                request, [b'HTTP/1.1 100 Continue\r\n\r\n'],
+                finished=False)
+
+        self._body_read = 0
+        self._body_chunks = []
+        self._body_consumer = None
+        if path is not None and path.stream_body:
+            self._body_consumer = path.resource()
+            self._body_consumer.prepare(self._conn, request)
+        elif request.headers.content_type.startswith(
+                HTTPRequestContentType.MULTIPART):
+            boundary = MultipartParser.boundary(request.headers.content_type)
+            if boundary is None:
+                self._reject(HTTPStatusCode.BAD_REQUEST)
                 return
+            self._multipart = MultipartParser(
+                boundary, reactor=self._conn.stream.reactor)
+        if self._chunked:
+            self._next_read = self._read_chunk_size
+        else:
+            self._body_left = content_length
+            self._next_read = self._read_body_data
+
+    def _read_chunk_size(self):
+        self._start_body_timer()
+        self._conn.stream.read_until(
+            b'\r\n', self._parse_chunk_size,
+            max_bytes=self.max_chunk_line_size)
+
+    def _parse_chunk_size(self, line):
+        self._cancel_idle_timer()
+        # Chunk extensions after ';' are ignored.
+        size = line.split(b';', 1)[0]
+        if not _CHUNK_SIZE.match(size):
+            self._reject(HTTPStatusCode.BAD_REQUEST)
+            self._read_done()
+            return
+        size = int(size, 16)
+        if size == 0:
+            self._trailer_size = 0
+            self._next_read = self._read_trailer
+        elif self._body_read + size > self._body_limit:
+            self._reject(HTTPStatusCode.REQUEST_ENTITY_TOO_LARGE)
+        else:
+            self._body_left = size
+            self._next_read = self._read_body_data
+        self._read_done()
+
+    def _read_body_data(self):
+        self._start_body_timer()
+        # Body is read in parts, so `body_timeout` applies to each of them.
+        size = min(self._body_left, self.body_chunk_size)
+        # Part is `memoryview` of receive buffer, so buffered body is copied
+        # only once when it is joined.
+        self._conn.stream.read_bytes(
+            size, self._parse_body_data, view=True)
+
+    def _parse_body_data(self, chunk):
+        self._cancel_idle_timer()
+        self._body_left -= len(chunk)
+        self._body_read += len(chunk)
+        if not self._body_left:
+            if self._chunked:
+                self._next_read = self._read_chunk_end
             else:
-                if self._request.method == HTTPMethod.GET:
-                    self._request.params = self._parse_params(self._request)
+                self._next_read = self._finish_body
+        if self._body_consumer is not None:
+            # Next chunk is read when resource is ready for it.
+            if isinstance(chunk, memoryview):
+                chunk = chunk.tobytes()
+            self._body_consumer.receive(chunk, self._read_done)
+        elif self._multipart is not None:
+            self._feed_multipart(chunk)
+        else:
+            self._body_chunks.append(chunk)
+            self._read_done()
 
-            self._handle_request()
+    def _feed_multipart(self, chunk):
+        """Parse chunk of multipart body. Next chunk is read after file
+        parts in it are written.
+
+        """
+        try:
+            waiter = self._multipart.feed(chunk)
+        except HTTPError as e:
+            self._reject(e.args[0])
+            self._read_done()
+            return
+        if waiter is None:
+            self._read_done()
+        else:
+            waiter.add_done_callback(self._on_multipart_written)
+
+    def _on_multipart_written(self, future):
+        if future.exception() is not None:
+            # Uploaded file can't be saved.
+            self._conn.close()
+        self._read_done()
+
+    def _read_chunk_end(self):
+        self._start_body_timer()
+        self._conn.stream.read_bytes(2, self._parse_chunk_end)
+
+    def _parse_chunk_end(self, chunk):
+        self._cancel_idle_timer()
+        if chunk != b'\r\n':
+            self._reject(HTTPStatusCode.BAD_REQUEST)
+        else:
+            self._next_read = self._read_chunk_size
+        self._read_done()
+
+    def _read_trailer(self):
+        self._start_body_timer()
+        self._conn.stream.read_until(
+            b'\r\n', self._parse_trailer,
+            max_bytes=self.max_chunk_line_size)
+
+    def _parse_trailer(self, line):
+        self._cancel_idle_timer()
+        # Trailer fields are ignored. Empty line ends chunked body.
+        # They are limited like header, so they can't grow memory forever.
+        self._trailer_size += len(line) + 2
+        if self._trailer_size > self.max_header_size:
+            self._reject(HTTPStatusCode.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        elif not line:
+            self._next_read = self._finish_body
+        self._read_done()
+
+    def _finish_body(self):
+        """Dispatch request after whole body is read"""
+        if self._body_consumer is not None:
+            self._handle_request(self._body_consumer)
+        elif self._multipart is not None:
+            self._finish_multipart()
+        else:
+            self._parse_body(b''.join(self._body_chunks))
+        self._read_done()
 
-        except IndexError:
-            raise WindException('Invalid header on incoming HTTP request')
+    def _finish_multipart(self):
+        parser = self._multipart
+        try:
+            parser.close()
+        except HTTPError as e:
+            self._reject(e.args[0])
+            return
+        self._request.params = parser.fields
+        self._request.files = parser.files
+        self._handle_request()
+
+    def _reject(self, status_code):
+        """Respond to current request with error before it is handled.
+        Rest of request can't be read, so connection is closed after
+        response.
+
+        """
+        request = self._request
+        request.keep_alive = False
+        self._closing = True
+        if self._multipart is not None:
+            self._multipart.discard()
+        self._request = self._body_consumer = self._multipart = None
+        self._body_chunks = []
+        self._next_read = self._read_header
+        if self._app is not None:
+            self._app.reject(self._conn, request, status_code)
+        else:
+            self._conn.close()
 
     def _parse_body(self, chunk):
         if self._request is None:
@@ -309,11 +1113,19 @@ class HTTPHandler(object):
         if self._request.method == HTTPMethod.POST:
             self._request.params = \
                 self._parse_params(self._request)
-        else:
-            raise NotImplementedError
 
         self._handle_request()
 
+    def _handle_request(self, resource=None):
+        request, self._request = self._request, None
+        self._next_read = self._read_header
+        self._body_chunks = []
+        self._body_consumer = self._multipart = None
+        if resource is not None:
+            resource.react(self._conn, request)
+        elif self._app is not None:
+            self._app.react(self._conn, request)
+
     def _parse_params(self, request):
         """Parse params in HTTP Request and return params `Dict`
 
@@ -338,75 +1150,6 @@ class HTTPHandler(object):
         if request.headers. \
                 content_type.startswith(HTTPRequestContentType.DEFAULT):
             return decode_dict(dict(parse_qsl(request.body)))
-        elif request.headers. \
-                content_type.startswith(HTTPRequestContentType.MULTIPART):
-            params = {}
-            self._parse_multipart(
-                request.headers.content_type, request.body, params=params)
-            return decode_dict(params)
-
-    def _parse_multipart(self, content_type, chunk, params=None):
-        try:
-            boundary = ''
-            # Find boundary
-            for type_ in content_type.split(';'):
-                pairs = type_.strip().partition('=')
-                if pairs[0] == 'boundary':
-                    boundary = pairs[2]
-            if not boundary:
-                raise WindException('Multipart header has no boundary')
-
-            separator = b'--'
-            end = chunk.find(separator + boundary + separator)
-            contents = [
-                x for x in chunk[:end].split(separator + boundary) if x]
-
-            # Iterate each content to parse data.
-            for content in contents:
-                content_end_idx = content.find(b'\r\n\r\n')
-                value = content[content_end_idx+4:-2]
-                elements = content[:content_end_idx].split(';')
-                elements = [x.strip() for x in elements]
-
-                # Separate contents sticked each other.
-                for elem in elements:
-                    if b'\r\n' in elem:
-                        elements.remove(elem)
-                        elements.extend(elem.split(b'\r\n'))
-
-                content_params = CaseInsensitiveDict()
-
-                def inject_param(raw, separator):
-                    pairs = raw.split(separator)
-                    # Remove unnecessary quote in param string.
-                    k, v = pairs
-                    if v.startswith('"') and v.endswith('"'):
-                        v = v[1:-1]
-                    content_params[k] = v
-
-                for elem in elements:
-                    if elem.find(': ') != -1:
-                        inject_param(elem, ': ')
-                        continue
-                    if elem.find('=') != -1:
-                        inject_param(elem, '=')
-                        continue
-
-                name = content_params.get('name')
-                if content_params.get('filename'):
-                    # TODO: Implement it
-                    pass
-
-                if params is not None:
-                    params[name] = value
-
-        except Exception as e:
-            # TODO: Warn for invalid post body
-            raise e
-
-    def _handle_request(self):
-        if self._app is not None:
-            self._app.react(self._conn, self._request)
 
     def __repr__(self):
         return '<HTTPHandler [%s]' % (self._conn.address[0])
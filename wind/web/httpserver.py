@@ -12,11 +12,19 @@ from wind.web.httpmodels import HTTPHandler
 
 
 class HTTPServer(TCPServer):
-    """HTTPServer class"""
-    def __init__(self, reactor=None, app=None, *args, **kwargs):
+    """HTTPServer class.
+    If `ssl_context` is given, connections are served over TLS.
+    (see `wind.stream.create_ssl_context`)
+
+    """
+    def __init__(self, reactor=None, app=None, ssl_context=None,
+                 *args, **kwargs):
         self._app = app
-        super(HTTPServer, self).__init__(*args, **kwargs)
+        self._ssl_context = ssl_context
+        super(HTTPServer, self).__init__(reactor, *args, **kwargs)
 
     def _event_handler(self, socket_, address):
-        handler = HTTPHandler(socket_, address, app=self._app)
+        handler = HTTPHandler(
+            socket_, address, app=self._app, ssl_context=self._ssl_context,
+            reactor=self.reactor)
         handler.serve_request()